@@ -0,0 +1,201 @@
+#Transmit engine benchmark: runs the CanApp start/refresh paths with a mocked Tk against python-can's virtual
+#interface (or a vcan/can channel) and measures frames/s, period jitter, CPU per active message, threads,
+#startup time and memory for 1/6/100 messages at 100/10/1 ms cycles. Every scenario runs in a fresh process
+#so memory, thread count and startup are not skewed by earlier ones; results go to a JSON file that a later
+#run can be compared against.
+#
+#    python benchmark.py --output bench_results.json
+#    python benchmark.py --interface vcan0 --bustype socketcan --compare bench_results.json
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_MESSAGES = "1,6,100"
+DEFAULT_CYCLES = "100,10,1"
+# Metrics compared by --compare, and whether a higher value is better
+COMPARED = {"frames_per_s": True, "jitter_p50_ms": False, "jitter_p99_ms": False, "cpu_ms_per_message_s": False,
+            "startup_ms": False, "rss_mb": False}
+
+
+def _rss_mb():
+    # Current resident set size; falls back to the peak where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def _bench_messages(count):
+    # The single-frame database messages first, then generated 16 bit messages on distinct proprietary PGNs
+    from signal_db import load_database, MessageDef, SignalDef
+    messages = [message for message in load_database() if message.definition.dlc <= 8][:count]
+    for index in range(len(messages), count):
+        signal = SignalDef("value", start_bit=0, length=16, default="0", integer=True)
+        messages.append(MessageDef(f"Bench {index:03d}", 0x18FF0080 | (index & 0xFF) << 8, [signal]).compile())
+    return messages
+
+
+def run_scenario(message_count, cycle_time_ms, duration_s, channel, bustype):
+    # Runs in the child process; returns the result dict
+    started = time.perf_counter()
+    import can_control_gui
+    from unittest import mock
+    from tractor_controller import TractorController
+    import_ms = (time.perf_counter() - started) * 1000
+
+    can_control_gui.tk = mock.MagicMock()
+    can_control_gui.ttk = mock.MagicMock()
+    can_control_gui.messagebox = mock.MagicMock()
+    messages = _bench_messages(message_count)
+    with contextlib.redirect_stdout(io.StringIO()):
+        controller = TractorController(messages, channel=channel, interface=bustype)
+        for message in messages:
+            controller.set_cycle_time(message.name, cycle_time_ms)
+        app = can_control_gui.CanApp(mock.MagicMock(), controller)
+        for message in messages:
+            app.start_transmission(message.name)
+    # Startup ends when every message has been on the bus once
+    deadline = time.perf_counter() + 10
+    while not all(stats is None or stats["sent"] for stats in controller.stats_snapshot().values()):
+        if time.perf_counter() > deadline:
+            raise RuntimeError("not every message was sent within 10 s of starting")
+        time.sleep(0.0005)
+    startup_ms = (time.perf_counter() - started) * 1000
+
+    # Let the first period settle, then measure over the window
+    time.sleep(min(1.0, cycle_time_ms / 1000 * 5))
+    sent_before = sum(stats["sent"] for stats in controller.stats_snapshot().values())
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    threads = threading.active_count()
+    while time.perf_counter() - wall_before < duration_s:
+        # What the 500 ms root.after tick does in the real GUI
+        time.sleep(app.stats_refresh_ms / 1000)
+        app.refresh_stats()
+    wall = time.perf_counter() - wall_before
+    cpu = time.process_time() - cpu_before
+    snapshot = controller.stats_snapshot()
+    rss_mb = _rss_mb()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        shutdown_started = time.perf_counter()
+        controller.shutdown()
+        shutdown_ms = (time.perf_counter() - shutdown_started) * 1000
+
+    stats = [value for value in snapshot.values() if value is not None]
+    sent = sum(value["sent"] for value in stats) - sent_before
+    return {
+        "messages": message_count,
+        "cycle_time_ms": cycle_time_ms,
+        "expected_frames_per_s": message_count * 1000 / cycle_time_ms,
+        "frames_per_s": sent / wall,
+        "jitter_p50_ms": statistics.median(value["jitter_p50_ms"] for value in stats),
+        "jitter_p99_ms": max(value["jitter_p99_ms"] for value in stats),
+        "jitter_max_ms": max(value["jitter_max_ms"] for value in stats),
+        "latency_p99_ms": max(value["latency_p99_ms"] for value in stats),
+        "errors": sum(value["errors"] for value in stats),
+        "dropped": sum(value["dropped"] for value in stats),
+        "cpu_percent": cpu / wall * 100,
+        "cpu_ms_per_message_s": cpu / wall / message_count * 1000,
+        "threads": threads,
+        "import_ms": import_ms,
+        "startup_ms": startup_ms,
+        "shutdown_ms": shutdown_ms,
+        "rss_mb": rss_mb,
+    }
+
+
+def run_all(message_counts, cycle_times_ms, duration_s, channel, bustype):
+    results = []
+    for message_count in message_counts:
+        for cycle_time_ms in cycle_times_ms:
+            # Each scenario gets its own channel so leftover frames of one never reach the next
+            scenario_channel = f"{channel}_{message_count}_{cycle_time_ms:g}" if bustype == "virtual" else channel
+            command = [sys.executable, os.path.abspath(__file__), "--run-scenario", f"{message_count}:{cycle_time_ms:g}",
+                       "--duration", str(duration_s), "--interface", scenario_channel, "--bustype", bustype]
+            output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+            result = json.loads(output.splitlines()[-1])
+            print_result(result)
+            results.append(result)
+    return results
+
+
+def print_result(result):
+    print(f"{result['messages']:4d} msgs @ {result['cycle_time_ms']:6g} ms: {result['frames_per_s']:9.1f} frames/s "
+          f"(expected {result['expected_frames_per_s']:g})  jitter p50/p99/max {result['jitter_p50_ms']:.3f}/"
+          f"{result['jitter_p99_ms']:.3f}/{result['jitter_max_ms']:.3f} ms  cpu {result['cpu_percent']:.1f}% "
+          f"({result['cpu_ms_per_message_s']:.3f} ms/msg/s)  threads {result['threads']}  "
+          f"startup {result['startup_ms']:.0f} ms  rss {result['rss_mb']:.1f} MB")
+    sys.stdout.flush()
+
+
+def compare(results, path):
+    # Percent change of each compared metric against a previous run, matched by scenario
+    with open(path) as f:
+        previous = {(result["messages"], result["cycle_time_ms"]): result for result in json.load(f)["results"]}
+    print(f"\nChange against {path}:")
+    for result in results:
+        old = previous.get((result["messages"], result["cycle_time_ms"]))
+        if old is None:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED.items():
+            if old[metric]:
+                change = (result[metric] - old[metric]) / old[metric] * 100
+                worse = change < 0 if higher_is_better else change > 0
+                changes.append(f"{metric} {change:+.1f}%{' !' if worse and abs(change) > 10 else ''}")
+        print(f"{result['messages']:4d} msgs @ {result['cycle_time_ms']:6g} ms: " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Tractor CAN transmit engine")
+    parser.add_argument("--interface", default="bench", help="CAN channel (default: a virtual channel per scenario)")
+    parser.add_argument("--bustype", default="virtual", help="python-can interface type (virtual, socketcan for vcan0)")
+    parser.add_argument("--messages", default=DEFAULT_MESSAGES, help="comma separated message counts")
+    parser.add_argument("--cycles", default=DEFAULT_CYCLES, help="comma separated cycle times in ms")
+    parser.add_argument("--duration", type=float, default=5.0, help="measured seconds per scenario")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", metavar="PATH", help="print the change against an earlier results file")
+    parser.add_argument("--run-scenario", metavar="MESSAGES:MS", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        message_count, cycle_time_ms = args.run_scenario.split(":")
+        result = run_scenario(int(message_count), float(cycle_time_ms), args.duration, args.interface, args.bustype)
+        print(json.dumps(result))
+        return
+
+    import can
+    results = run_all([int(count) for count in args.messages.split(",")], [float(ms) for ms in args.cycles.split(",")],
+                      args.duration, args.interface, args.bustype)
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "python_can": can.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "interface": args.interface,
+        "bustype": args.bustype,
+        "duration_s": args.duration,
+        "results": results,
+    }
+    if args.compare:
+        compare(results, args.compare)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
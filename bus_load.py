@@ -0,0 +1,30 @@
+#Expected bus utilisation of a set of cyclic frames.
+#Each frame is counted at its worst-case length on the wire (every stuffable bit stuffed, plus the 3 bit
+#interframe space), so the estimate is an upper bound the bus has to fit even with unlucky payloads.
+
+DEFAULT_BITRATE = 250000
+# Above this the UI warns; J1939 networks are normally kept well below full load
+LOAD_WARNING = 0.7
+
+
+def frame_bits(dlc, is_extended_id=True):
+    # Classic CAN data frame: 34 (11 bit ID) or 54 (29 bit ID) stuffable header bits plus 8 * dlc data bits
+    # can gain one stuff bit per 4, on top of 47 / 67 bits of fixed overhead (CRC delimiter, ACK, EOF, IFS)
+    stuffable = (54 if is_extended_id else 34) + 8 * dlc
+    return (67 if is_extended_id else 47) + 8 * dlc + (stuffable - 1) // 4
+
+
+def message_bits(length, is_extended_id=True):
+    # Payloads over 8 bytes go out as a J1939 TP.CM plus one 8 byte TP.DT per 7 bytes of data
+    if length <= 8:
+        return frame_bits(length, is_extended_id)
+    return frame_bits(8) * (1 + (length + 6) // 7)
+
+
+def bus_load(frames, bitrate=DEFAULT_BITRATE):
+    # frames: iterable of (payload length, is_extended_id, period_s); returns the fraction of the bitrate used (1.0 = full)
+    return sum(message_bits(length, is_extended_id) / period_s for length, is_extended_id, period_s in frames) / bitrate
+
+
+def format_load(load, bitrate=DEFAULT_BITRATE):
+    return f"{load:.1%} of {bitrate / 1000:g} kbit/s"
@@ -2,236 +2,67 @@
 #allow control of transmission of Tractor messages
 #Created by Ian Tempelmeyer 09/15/2024
 
-import can
-import tkinter as tk
-from tkinter import ttk
-import threading
-import time
+import argparse
 import warnings
 import sys
 import os
+import time
+
+# Reference point of the startup report
+LAUNCHED = time.perf_counter()
+
+from bus_load import LOAD_WARNING, format_load
+from session import DEFAULT_SESSION, ColdStart, SessionSaver, load_session
+from tx_stats import StatsLogger, format_stats
+
+# tkinter is imported in run_gui only, so --headless never loads Tk or needs an X server; headless (and with it
+# python-can) is imported in main after a saved session's frames are already back on the bus
+tk = None
+ttk = None
+messagebox = None
 
 # Suppress DeprecationWarnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-# Redirect standard error to suppress specific messages
-sys.stderr = open(os.devnull, 'w')
-
 class CanApp:
-    def __init__(self, root):
+    def __init__(self, root, controller, session=None):
         self.root = root
         self.root.title("CAN Interface GUI")
 
         self.root.bind("<Control-z>", self.quit_application)
 
-        self.default_can_interface = "can0"
-        self.default_cycle_time_ms = 100
+        self.controller = controller
+        self.default_can_interface = controller.channel
+        # Optional session.SessionSaver, updated on the stats tick and before shutdown
+        self.session = session
 
 #Frame and Widget (GUI) Setup
-
-        # Frame for Engine RPM CAN message controls
-        self.frame_original = ttk.Frame(self.root)
-        self.frame_original.grid(row=0, column=0, padx=10, pady=10)
-
-        # Engine RPM Title and Entry
-        self.rpm_label = ttk.Label(self.frame_original, text="Engine RPM:")
-        self.rpm_label.grid(row=0, column=0, columnspan=2, pady=5, sticky=tk.W)
-
-        self.rpm_entry = ttk.Entry(self.frame_original, width=10)
-        self.rpm_entry.grid(row=1, column=0, columnspan=2, pady=5)
-        self.rpm_entry.insert(0, "0")  # Set default value to 0
-
-        # Cycle Time and CAN Interface Labels for Engine RPM
-        self.cycle_time_label = ttk.Label(self.frame_original, text=f"Cycle Time: {self.default_cycle_time_ms} ms")
-        self.cycle_time_label.grid(row=2, column=0, columnspan=2, pady=5)
-
-        self.can_interface_label = ttk.Label(self.frame_original, text=f"CAN Interface: {self.default_can_interface}")
-        self.can_interface_label.grid(row=3, column=0, columnspan=2, pady=5)
-
-        # Engine RPM CAN message Start/Stop Buttons
-        self.start_button = ttk.Button(self.frame_original, text="Start", command=self.start_engine_rpm_transmission)
-        self.start_button.grid(row=4, column=0, pady=5)
-
-        self.stop_button = ttk.Button(self.frame_original, text="Stop", command=self.stop_engine_rpm_transmission)
-        self.stop_button.grid(row=4, column=1, pady=5)
-
-        # Status Label for Engine RPM CAN message
-        self.original_status_label = ttk.Label(self.frame_original, text="Engine RPM CAN Message Status: Idle", foreground="red")
-        self.original_status_label.grid(row=5, column=0, columnspan=2, pady=5)
-
-        # Frame for the IVT Status CAN message controls
-        self.frame_ivt = ttk.Frame(self.root)
-        self.frame_ivt.grid(row=0, column=1, padx=10, pady=10)
-
-        # IVT Status Toggle Switch
-        ttk.Label(self.frame_ivt, text="IVT Status").grid(row=0, column=0, columnspan=2, pady=5)
-        self.ivt_status_var = tk.StringVar(value="Not Parked")
-        self.ivt_status_combobox = ttk.Combobox(self.frame_ivt, textvariable=self.ivt_status_var, values=["Parked", "Not Parked"], state="readonly")
-        self.ivt_status_combobox.grid(row=1, column=0, columnspan=2, pady=5)
-        self.ivt_status_combobox.bind("<<ComboboxSelected>>", self.update_ivt_status)
-
-        # Cycle Time and CAN Interface Labels for IVT Status
-        self.ivt_cycle_time_label = ttk.Label(self.frame_ivt, text=f"Cycle Time: {self.default_cycle_time_ms} ms")
-        self.ivt_cycle_time_label.grid(row=2, column=0, columnspan=2, pady=5)
-
-        self.ivt_can_interface_label = ttk.Label(self.frame_ivt, text=f"CAN Interface: {self.default_can_interface}")
-        self.ivt_can_interface_label.grid(row=3, column=0, columnspan=2, pady=5)
-
-        # IVT Status CAN message Start/Stop Buttons
-        self.start_ivt_button = ttk.Button(self.frame_ivt, text="Start", command=self.start_ivt_transmission)
-        self.start_ivt_button.grid(row=4, column=0, pady=5)
-
-        self.stop_ivt_button = ttk.Button(self.frame_ivt, text="Stop", command=self.stop_ivt_transmission)
-        self.stop_ivt_button.grid(row=4, column=1, pady=5)
-
-        # Status Label for IVT Status CAN message
-        self.ivt_status_label = ttk.Label(self.frame_ivt, text="IVT Status CAN Message Status: Idle", foreground="red")
-        self.ivt_status_label.grid(row=5, column=0, columnspan=2, pady=5)
-
-        # Frame for the Tractor Guidance CAN message controls
-        self.frame_tractor_guidance = ttk.Frame(self.root)
-        self.frame_tractor_guidance.grid(row=0, column=2, padx=10, pady=10)
-
-        # Tractor Guidance Title and Entry
-        self.tractor_guidance_label = ttk.Label(self.frame_tractor_guidance, text="Tractor Guidance (1/m):")
-        self.tractor_guidance_label.grid(row=0, column=0, columnspan=2, pady=5, sticky=tk.W)
-
-        self.tractor_guidance_entry = ttk.Entry(self.frame_tractor_guidance, width=10)
-        self.tractor_guidance_entry.grid(row=1, column=0, columnspan=2, pady=5)
-        self.tractor_guidance_entry.insert(0, "0")  # Set default value to 0
-
-        # Cycle Time and CAN Interface Labels for Tractor Guidance
-        self.tractor_guidance_cycle_time_label = ttk.Label(self.frame_tractor_guidance, text=f"Cycle Time: {self.default_cycle_time_ms} ms")
-        self.tractor_guidance_cycle_time_label.grid(row=2, column=0, columnspan=2, pady=5)
-
-        self.tractor_guidance_can_interface_label = ttk.Label(self.frame_tractor_guidance, text=f"CAN Interface: {self.default_can_interface}")
-        self.tractor_guidance_can_interface_label.grid(row=3, column=0, columnspan=2, pady=5)
-
-        # Tractor Guidance CAN message Start/Stop Buttons
-        self.start_tractor_guidance_button = ttk.Button(self.frame_tractor_guidance, text="Start", command=self.start_tractor_guidance_transmission)
-        self.start_tractor_guidance_button.grid(row=4, column=0, pady=5)
-
-        self.stop_tractor_guidance_button = ttk.Button(self.frame_tractor_guidance, text="Stop", command=self.stop_tractor_guidance_transmission)
-        self.stop_tractor_guidance_button.grid(row=4, column=1, pady=5)
-
-        # Status Label for Tractor Guidance CAN message
-        self.tractor_guidance_status_label = ttk.Label(self.frame_tractor_guidance, text="Tractor Guidance CAN Message Status: Idle", foreground="red")
-        self.tractor_guidance_status_label.grid(row=5, column=0, columnspan=2, pady=5)
-
-        # Frame for the Hand Throttle % CAN message controls
-        self.frame_hand_throttle = ttk.Frame(self.root)
-        self.frame_hand_throttle.grid(row=1, column=0, padx=10, pady=10)
-
-        # Hand Throttle % Title and Entry
-        self.hand_throttle_label = ttk.Label(self.frame_hand_throttle, text="Hand Throttle %:")
-        self.hand_throttle_label.grid(row=0, column=0, columnspan=2, pady=5, sticky=tk.W)
-
-        self.hand_throttle_entry = ttk.Entry(self.frame_hand_throttle, width=10)
-        self.hand_throttle_entry.grid(row=1, column=0, columnspan=2, pady=5)
-        self.hand_throttle_entry.insert(0, "0")  # Set default value to 0
-
-        # Cycle Time and CAN Interface Labels for Hand Throttle %
-        self.hand_throttle_cycle_time_label = ttk.Label(self.frame_hand_throttle, text=f"Cycle Time: {self.default_cycle_time_ms} ms")
-        self.hand_throttle_cycle_time_label.grid(row=2, column=0, columnspan=2, pady=5)
-
-        self.hand_throttle_can_interface_label = ttk.Label(self.frame_hand_throttle, text=f"CAN Interface: {self.default_can_interface}")
-        self.hand_throttle_can_interface_label.grid(row=3, column=0, columnspan=2, pady=5)
-
-        # Hand Throttle % CAN message Start/Stop Buttons
-        self.start_hand_throttle_button = ttk.Button(self.frame_hand_throttle, text="Start", command=self.start_hand_throttle_transmission)
-        self.start_hand_throttle_button.grid(row=4, column=0, pady=5)
-
-        self.stop_hand_throttle_button = ttk.Button(self.frame_hand_throttle, text="Stop", command=self.stop_hand_throttle_transmission)
-        self.stop_hand_throttle_button.grid(row=4, column=1, pady=5)
-
-        # Status Label for Hand Throttle % CAN message
-        self.hand_throttle_status_label = ttk.Label(self.frame_hand_throttle, text="Hand Throttle % CAN Message Status: Idle", foreground="red")
-        self.hand_throttle_status_label.grid(row=5, column=0, columnspan=2, pady=5)
-
-	# Frame for the Set Speed MPH CAN message controls
-        self.frame_set_speed = ttk.Frame(self.root)
-        self.frame_set_speed.grid(row=1, column=1, padx=10, pady=10)
-
-        # Set Speed MPH Title
-        self.set_speed_label = ttk.Label(self.frame_set_speed, text="Set Speed MPH:")
-        self.set_speed_label.grid(row=0, column=0, columnspan=4, pady=5, sticky=tk.W)
-
-        # F1 Entry and Label
-        self.f1_label = ttk.Label(self.frame_set_speed, text="F1:")
-        self.f1_label.grid(row=1, column=0, pady=5, sticky=tk.E)
-
-        self.f1_entry = ttk.Entry(self.frame_set_speed, width=10)
-        self.f1_entry.grid(row=1, column=1, pady=5)
-        self.f1_entry.insert(0, "10.0")  # Set default value to 10.0
-
-        # F2 Entry and Label
-        self.f2_label = ttk.Label(self.frame_set_speed, text="F2:")
-        self.f2_label.grid(row=1, column=2, pady=5, sticky=tk.E)
-
-        self.f2_entry = ttk.Entry(self.frame_set_speed, width=10)
-        self.f2_entry.grid(row=1, column=3, pady=5)
-        self.f2_entry.insert(0, "31.0")  # Set default value to 31.0
-
-        # Cycle Time and CAN Interface Labels for Set Speed MPH
-        self.set_speed_cycle_time_label = ttk.Label(self.frame_set_speed, text=f"Cycle Time: {self.default_cycle_time_ms} ms")
-        self.set_speed_cycle_time_label.grid(row=2, column=0, columnspan=4, pady=5)
-
-        self.set_speed_can_interface_label = ttk.Label(self.frame_set_speed, text=f"CAN Interface: {self.default_can_interface}")
-        self.set_speed_can_interface_label.grid(row=3, column=0, columnspan=4, pady=5)
-
-        # Set Speed MPH CAN message Start/Stop Buttons
-        self.start_set_speed_button = ttk.Button(self.frame_set_speed, text="Start", command=self.start_set_speed_transmission)
-        self.start_set_speed_button.grid(row=4, column=0, columnspan=2, pady=5)
-
-        self.stop_set_speed_button = ttk.Button(self.frame_set_speed, text="Stop", command=self.stop_set_speed_transmission)
-        self.stop_set_speed_button.grid(row=4, column=2, columnspan=2, pady=5)
-
-        # Status Label for Set Speed MPH CAN message
-        self.set_speed_status_label = ttk.Label(self.frame_set_speed, text="Set Speed MPH CAN Message Status: Idle", foreground="red")
-        self.set_speed_status_label.grid(row=5, column=0, columnspan=4, pady=5)
-
-        # Frame for the Tractor Speed CAN message controls
-        self.frame_tractor_speed = ttk.Frame(self.root)
-        self.frame_tractor_speed.grid(row=1, column=2, padx=10, pady=10)
-
-        # Tractor Speed Title and Entry
-        self.tractor_speed_label = ttk.Label(self.frame_tractor_speed, text="Tractor Speed (m/s):")
-        self.tractor_speed_label.grid(row=0, column=0, columnspan=2, pady=5, sticky=tk.W)
-
-        self.tractor_speed_entry = ttk.Entry(self.frame_tractor_speed, width=10)
-        self.tractor_speed_entry.grid(row=1, column=0, columnspan=2, pady=5)
-        self.tractor_speed_entry.insert(0, "0")  # Set default value to 0
-
-        # Cycle Time and CAN Interface Labels for Tractor Speed
-        self.tractor_speed_cycle_time_label = ttk.Label(self.frame_tractor_speed, text=f"Cycle Time: {self.default_cycle_time_ms} ms")
-        self.tractor_speed_cycle_time_label.grid(row=2, column=0, columnspan=2, pady=5)
-
-        self.tractor_speed_can_interface_label = ttk.Label(self.frame_tractor_speed, text=f"CAN Interface: {self.default_can_interface}")
-        self.tractor_speed_can_interface_label.grid(row=3, column=0, columnspan=2, pady=5)
-
-        # Tractor Speed CAN message Start/Stop Buttons
-        self.start_tractor_speed_button = ttk.Button(self.frame_tractor_speed, text="Start", command=self.start_tractor_speed_transmission)
-        self.start_tractor_speed_button.grid(row=4, column=0, pady=5)
-
-        self.stop_tractor_speed_button = ttk.Button(self.frame_tractor_speed, text="Stop", command=self.stop_tractor_speed_transmission)
-        self.stop_tractor_speed_button.grid(row=4, column=1, pady=5)
-
-        # Status Label for Tractor Speed CAN message
-        self.tractor_speed_status_label = ttk.Label(self.frame_tractor_speed, text="Tractor Speed CAN Message Status: Idle", foreground="red")
-        self.tractor_speed_status_label.grid(row=5, column=0, columnspan=2, pady=5)
+# One frame per message in the signal database, laid out three to a row
+
+        self.message_frames = {}
+        self.signal_widgets = {}
+        self.cycle_widgets = {}
+        self.status_labels = {}
+        # Messages whose last start failed because the interface could not be opened
+        self.unavailable = set()
+        for index, message in enumerate(self.controller.messages.values()):
+            self.build_message_frame(message, row=index // 3, column=index % 3)
+        self.build_receive_frame(row=(len(self.controller.messages) + 2) // 3)
+        self.build_replay_frame(row=(len(self.controller.messages) + 2) // 3 + 1)
+        self.build_profile_frame(row=(len(self.controller.messages) + 2) // 3 + 2)
+
+        # Worst-case bus load of the started messages at the configured bitrate
+        self.bus_load_label = ttk.Label(self.root, text=f"Expected Bus Load: {format_load(0, self.controller.bitrate)}")
+        self.bus_load_label.grid(row=(len(self.controller.messages) + 2) // 3 + 3, column=0, columnspan=3, padx=10, pady=5, sticky=tk.W)
+        self.build_plot_frame(row=(len(self.controller.messages) + 2) // 3 + 4)
+
+        # Live send/jitter counters replace the bare Sending/Idle text
+        self.stats_refresh_ms = 500
+        self.root.after(self.stats_refresh_ms, self.refresh_stats)
 
 #        label = tk.label(root, text="Pres Ctrl+Z to quite the GUI")
 #        label.pack()
 
-# CAN Message Initialization defaults
-
-        self.engine_rpm_transmission_active = False
-        self.ivt_transmission_active = False
-        self.tractor_guidance_transmission_active = False
-        self.hand_throttle_transmission_active = False
-        self.set_speed_transmission_active = False
-        self.tractor_speed_transmission_active = False
-
 #        self.signal_tread = threading.Thread(target=self.setup_signal_handling)
 #        self.signal_thread.start()
 
@@ -243,259 +74,574 @@ class CanApp:
 #        self.root.quit()
 #        sys.exit(0)
 
+    def build_message_frame(self, message, row, column):
+        definition = message.definition
+        span = max(2, 2 * len(definition.signals))
+
+        frame = ttk.Frame(self.root)
+        frame.grid(row=row, column=column, padx=10, pady=10)
+        self.message_frames[message.name] = frame
+
+        # Message Title
+        ttk.Label(frame, text=definition.label).grid(row=0, column=0, columnspan=span, pady=5, sticky=tk.W)
+
+        # One Entry (or Combobox for enumerated signals) per signal, re-encoded only when edited
+        for index, signal in enumerate(definition.signals):
+            value = self.controller.values[message.name][signal.name]
+            if signal.label:
+                ttk.Label(frame, text=signal.label).grid(row=1, column=2 * index, pady=5, sticky=tk.E)
+                entry_column, entry_span = 2 * index + 1, 1
+            else:
+                entry_column, entry_span = 2 * index, 2
+            if signal.choices:
+                variable = tk.StringVar(value=value)
+                widget = ttk.Combobox(frame, textvariable=variable, values=list(signal.choices), state="readonly")
+                widget.bind("<<ComboboxSelected>>", lambda event, m=message.name, s=signal.name: self.update_value(m, s))
+            else:
+                widget = ttk.Entry(frame, width=10)
+                widget.insert(0, str(value))
+                widget.bind("<KeyRelease>", lambda event, m=message.name, s=signal.name: self.update_value(m, s))
+                widget.bind("<FocusOut>", lambda event, m=message.name, s=signal.name: self.update_value(m, s))
+            widget.grid(row=1, column=entry_column, columnspan=entry_span, pady=5)
+            self.signal_widgets[(message.name, signal.name)] = widget
+
+        # Cycle Time (editable while sending) and CAN Interface Label
+        half = span // 2
+        ttk.Label(frame, text="Cycle Time (ms):").grid(row=2, column=0, columnspan=half, pady=5, sticky=tk.E)
+        cycle_entry = ttk.Entry(frame, width=10)
+        cycle_entry.insert(0, f"{self.controller.cycle_times_ms[message.name]:g}")
+        cycle_entry.bind("<Return>", lambda event, m=message.name: self.update_cycle_time(m))
+        cycle_entry.bind("<FocusOut>", lambda event, m=message.name: self.update_cycle_time(m))
+        cycle_entry.grid(row=2, column=half, columnspan=half, pady=5, sticky=tk.W)
+        self.cycle_widgets[message.name] = cycle_entry
+        ttk.Label(frame, text=f"CAN Interface: {self.default_can_interface}").grid(row=3, column=0, columnspan=span, pady=5)
+
+        # CAN message Start/Stop Buttons
+        ttk.Button(frame, text="Start", command=lambda: self.start_transmission(message.name)).grid(row=4, column=0, columnspan=half, pady=5)
+        ttk.Button(frame, text="Stop", command=lambda: self.stop_transmission(message.name)).grid(row=4, column=half, columnspan=half, pady=5)
+
+        # Status Label
+        # Messages restored from the session or started by --start are already sending
+        self.status_labels[message.name] = ttk.Label(frame)
+        self.status_labels[message.name].grid(row=5, column=0, columnspan=span, pady=5)
+        self.update_status(message.name, "Sending" if self.controller.is_active(message.name) else "Idle")
+
+    def build_receive_frame(self, row):
+        # Latest value per received ID, refreshed from the ring buffer by one root.after tick (not per frame)
+        self.rx_refresh_ms = 66
+        self.rx_after_id = None
+
+        frame = ttk.Frame(self.root)
+        frame.grid(row=row, column=0, columnspan=3, padx=10, pady=10, sticky=tk.W + tk.E)
+
+        ttk.Label(frame, text="Receive Monitor").grid(row=0, column=0, pady=5, sticky=tk.W)
+        ttk.Button(frame, text="Start", command=self.start_receive).grid(row=0, column=1, pady=5)
+        ttk.Button(frame, text="Stop", command=self.stop_receive).grid(row=0, column=2, pady=5)
+        self.rx_status_label = ttk.Label(frame, text="Receive Monitor Status: Idle", foreground="red")
+        self.rx_status_label.grid(row=0, column=3, padx=10, pady=5)
+
+        ttk.Button(frame, text="Record", command=self.start_recording).grid(row=0, column=4, pady=5)
+        ttk.Button(frame, text="Stop Recording", command=self.stop_recording).grid(row=0, column=5, pady=5)
+        self.record_status_label = ttk.Label(frame, text="Recording: Off", foreground="red")
+        self.record_status_label.grid(row=0, column=6, padx=10, pady=5)
+
+        self.responder_var = tk.BooleanVar(value=self.controller.responder is not None)
+        ttk.Checkbutton(frame, text="J1939 Responder", variable=self.responder_var, command=self.toggle_responder).grid(row=0, column=7, padx=10, pady=5)
+
+        columns = ("id", "name", "count", "rate", "data", "decoded")
+        self.rx_table = ttk.Treeview(frame, columns=columns, show="headings", height=8)
+        for column, heading, width in zip(columns, ("ID", "Message", "Count", "Rate (Hz)", "Data", "Decoded"), (100, 140, 70, 70, 170, 320)):
+            self.rx_table.heading(column, text=heading)
+            self.rx_table.column(column, width=width)
+        self.rx_table.grid(row=1, column=0, columnspan=8, pady=5)
+
+    def toggle_responder(self):
+        # Requests are answered from the receive thread; the GUI only switches the responder on and off
+        if self.responder_var.get():
+            self.controller.start_responder()
+        else:
+            self.controller.stop_responder()
+
+    def start_receive(self):
+        self.controller.start_receive()
+        self.rx_status_label.config(text="Receive Monitor Status: Listening", foreground="green")
+        if self.rx_after_id is None:
+            self.rx_after_id = self.root.after(self.rx_refresh_ms, self.refresh_receive)
+
+    def stop_receive(self):
+        self.controller.stop_receive()
+        self.rx_status_label.config(text="Receive Monitor Status: Idle", foreground="red")
+        if self.rx_after_id is not None:
+            self.root.after_cancel(self.rx_after_id)
+            self.rx_after_id = None
+
+    def build_plot_frame(self, row):
+        # Strip chart of commanded (TX) and decoded received (RX) signals; sampling and drawing share one
+        # root.after tick and every trace is reduced to min/max per pixel column before it reaches the canvas
+        self.plot_refresh_ms = 100
+        self.plot_span_s = 30.0
+        self.plot_after_id = None
+        self.plot_traces = {}
+        self.plot_tx_ring = None
+
+        frame = ttk.Frame(self.root)
+        frame.grid(row=row, column=0, columnspan=3, padx=10, pady=10, sticky=tk.W + tk.E)
+
+        ttk.Label(frame, text="Strip Chart").grid(row=0, column=0, pady=5, sticky=tk.W)
+        ttk.Button(frame, text="Plot", command=self.start_plot).grid(row=0, column=1, pady=5)
+        ttk.Button(frame, text="Stop", command=self.stop_plot).grid(row=0, column=2, pady=5)
+
+        self.plot_choices = [(direction, message.name, signal.name)
+                             for direction in ("TX", "RX")
+                             for message in self.controller.messages.values() if message.definition.dlc <= 8
+                             for signal in message.definition.signals]
+        self.plot_list = tk.Listbox(frame, selectmode=tk.MULTIPLE, exportselection=False, height=8, width=40)
+        for direction, message_name, signal_name in self.plot_choices:
+            self.plot_list.insert(tk.END, f"{direction} {message_name}.{signal_name}")
+        self.plot_list.grid(row=1, column=0, columnspan=3, pady=5, sticky=tk.N)
+        self.plot_canvas = tk.Canvas(frame, width=640, height=200, background="white")
+        self.plot_canvas.grid(row=1, column=3, padx=10, pady=5)
+
+    def start_plot(self):
+        from strip_chart import Trace
+        self.stop_plot()
+        self.plot_canvas.delete("all")
+        self.plot_traces = {}
+        colors = ("blue", "red", "green", "orange", "purple", "brown", "magenta", "black")
+        for index in self.plot_list.curselection():
+            key = self.plot_choices[index]
+            color = colors[len(self.plot_traces) % len(colors)]
+            line = self.plot_canvas.create_line(0, 0, 0, 0, fill=color)
+            legend = self.plot_canvas.create_text(5, 5 + 12 * len(self.plot_traces), anchor=tk.NW, fill=color, text="")
+            self.plot_traces[key] = (Trace(f"{key[0]} {key[1]}.{key[2]}"), line, legend)
+        if any(direction == "TX" for direction, _, _ in self.plot_traces):
+            self.plot_tx_ring = self.controller.start_tx_capture()
+            self.plot_tx_position = self.plot_tx_ring.count
+        if any(direction == "RX" for direction, _, _ in self.plot_traces):
+            self.start_receive()
+        self.plot_monitor = None
+        self.plot_after_id = self.root.after(self.plot_refresh_ms, self.refresh_plot)
+
+    def stop_plot(self):
+        if self.plot_after_id is not None:
+            self.root.after_cancel(self.plot_after_id)
+            self.plot_after_id = None
+        self.controller.stop_tx_capture()
+        self.plot_tx_ring = None
+
+    def sample_plot(self, now):
+        # Commanded values: every frame the scheduler sent since the last tick (profile samples and fast cycles
+        # included, so the min/max decimation sees what was on the bus); a message that sent nothing (idle, or
+        # timed by kernel BCM) gets one sample of its current frame
+        if self.plot_tx_ring is not None:
+            indices, self.plot_tx_position, _ = self.plot_tx_ring.read_since(self.plot_tx_position)
+            decoded = self.decode_plot_frames("TX", self.plot_tx_ring, indices)
+            for (direction, message_name, signal_name), (trace, _, _) in self.plot_traces.items():
+                if direction != "TX":
+                    continue
+                timestamps, values = decoded[message_name]
+                if len(timestamps):
+                    trace.extend(timestamps, values[signal_name])
+                    continue
+                message = self.controller.messages[message_name]
+                value = message.decode(self.controller.current_message(message_name).data)[signal_name]
+                # Enumerated signals are plotted as their raw value
+                trace.extend([now], [message.signals[signal_name].choices.get(value, value) if isinstance(value, str) else value])
+
+        # Received values: every frame that arrived since the last tick
+        monitor = self.controller.rx_monitor
+        if monitor is None:
+            return
+        if monitor is not self.plot_monitor:
+            self.plot_monitor = monitor
+            self.plot_position = monitor.ring.count
+        indices, self.plot_position, _ = monitor.ring.read_since(self.plot_position)
+        if len(indices) == 0:
+            return
+        decoded = self.decode_plot_frames("RX", monitor.ring, indices)
+        for (direction, message_name, signal_name), (trace, _, _) in self.plot_traces.items():
+            if direction != "RX":
+                continue
+            timestamps, values = decoded[message_name]
+            if len(timestamps):
+                trace.extend(timestamps, values[signal_name])
+
+    def decode_plot_frames(self, direction, ring, indices):
+        # {message name: (timestamps, {signal: values})} for the plotted messages, one vectorised decode each
+        ids = ring.ids[indices]
+        decoded = {}
+        for trace_direction, message_name, _ in self.plot_traces:
+            if trace_direction != direction or message_name in decoded:
+                continue
+            message = self.controller.messages[message_name]
+            match = (ids & 0x03FFFF00) == (message.arbitration_id & 0x03FFFF00) if message.is_extended_id else ids == message.arbitration_id
+            selected = indices[match]
+            decoded[message_name] = (ring.timestamps[selected], message.decode_array(ring.data[selected]))
+        return decoded
+
+    def refresh_plot(self):
+        from strip_chart import decimate_minmax, polyline
+        now = time.time()
+        self.sample_plot(now)
+        width = int(self.plot_canvas.winfo_width()) or 640
+        height = int(self.plot_canvas.winfo_height()) or 200
+        start_time = now - self.plot_span_s
+        for trace, line, legend in self.plot_traces.values():
+            times, values = trace.window(start_time)
+            columns, minimums, maximums = decimate_minmax(times, values, start_time, now, width)
+            if len(columns) == 0:
+                continue
+            low, high = float(minimums.min()), float(maximums.max())
+            points = polyline(columns, minimums, maximums, low, high, height)
+            if len(points) < 8:
+                points = points + points
+            self.plot_canvas.coords(line, *points)
+            self.plot_canvas.itemconfig(legend, text=f"{trace.label}  [{low:g} .. {high:g}]  last {values[-1]:g}")
+        self.plot_after_id = self.root.after(self.plot_refresh_ms, self.refresh_plot)
+
+    def build_replay_frame(self, row):
+        # Replays a trace on the same bus; any message started above overrides its ID in the log
+        frame = ttk.Frame(self.root)
+        frame.grid(row=row, column=0, columnspan=3, padx=10, pady=10, sticky=tk.W + tk.E)
+
+        ttk.Label(frame, text="Log Replay:").grid(row=0, column=0, pady=5, sticky=tk.W)
+        self.replay_path_entry = ttk.Entry(frame, width=40)
+        self.replay_path_entry.grid(row=0, column=1, columnspan=3, pady=5)
+
+        ttk.Label(frame, text="Speed:").grid(row=0, column=4, pady=5, sticky=tk.E)
+        self.replay_speed_var = tk.StringVar(value="1")
+        ttk.Combobox(frame, textvariable=self.replay_speed_var, values=["0.5", "1", "10"], width=5).grid(row=0, column=5, pady=5)
+
+        ttk.Label(frame, text="Include IDs:").grid(row=1, column=0, pady=5, sticky=tk.W)
+        self.replay_include_entry = ttk.Entry(frame, width=30)
+        self.replay_include_entry.grid(row=1, column=1, pady=5)
+        ttk.Label(frame, text="Exclude IDs:").grid(row=1, column=2, pady=5, sticky=tk.E)
+        self.replay_exclude_entry = ttk.Entry(frame, width=30)
+        self.replay_exclude_entry.grid(row=1, column=3, pady=5)
+
+        ttk.Button(frame, text="Start", command=self.start_replay).grid(row=1, column=4, pady=5)
+        ttk.Button(frame, text="Stop", command=self.stop_replay).grid(row=1, column=5, pady=5)
+
+        self.replay_status_label = ttk.Label(frame, text="Replay Status: Idle", foreground="red")
+        self.replay_status_label.grid(row=2, column=0, columnspan=6, pady=5)
+
+    def start_replay(self):
+        from headless import parse_id_list
+        try:
+            speed = float(self.replay_speed_var.get())
+            include_ids = parse_id_list(self.replay_include_entry.get())
+            exclude_ids = parse_id_list(self.replay_exclude_entry.get())
+        except ValueError:
+            print("Invalid replay speed or ID list entered.")
+            return
+        path = self.replay_path_entry.get().strip()
+        if not os.path.exists(path):
+            print(f"Replay file not found: {path}")
+            return
+        try:
+            self.controller.start_replay(path, speed, include_ids, exclude_ids)
+        except ValueError as e:
+            print(f"Invalid replay settings: {e}")
+
+    def stop_replay(self):
+        self.controller.stop_replay()
+        self.replay_status_label.config(text="Replay Status: Idle", foreground="red")
+
+    def build_profile_frame(self, row):
+        # Drive-cycle profile (ramps, steps, sines, CSV) precomputed into payload buffers at load time
+        frame = ttk.Frame(self.root)
+        frame.grid(row=row, column=0, columnspan=3, padx=10, pady=10, sticky=tk.W + tk.E)
+
+        ttk.Label(frame, text="Drive-Cycle Profile:").grid(row=0, column=0, pady=5, sticky=tk.W)
+        self.profile_path_entry = ttk.Entry(frame, width=40)
+        self.profile_path_entry.grid(row=0, column=1, pady=5)
+        ttk.Button(frame, text="Start", command=self.start_profile).grid(row=0, column=2, pady=5)
+        ttk.Button(frame, text="Stop", command=self.stop_profile).grid(row=0, column=3, pady=5)
+        self.profile_status_label = ttk.Label(frame, text="Profile Status: Idle", foreground="red")
+        self.profile_status_label.grid(row=0, column=4, padx=10, pady=5)
+
+    def start_profile(self):
+        path = self.profile_path_entry.get().strip()
+        try:
+            self.controller.start_profile(path)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Could not load profile {path}: {e}")
+            return
+        for message_name in self.controller.profile_messages:
+            self.update_status(message_name, "Sending")
+
+    def stop_profile(self):
+        self.controller.stop_profile()
+        self.profile_status_label.config(text="Profile Status: Idle", foreground="red")
+
+    def start_recording(self):
+        path = time.strftime("tractor_can_%Y%m%d_%H%M%S.tcr")
+        self.controller.start_recording(path)
+        self.start_receive()
+        self.record_status_label.config(text=f"Recording: {path}", foreground="green")
+
+    def stop_recording(self):
+        self.controller.stop_recording()
+        self.record_status_label.config(text="Recording: Off", foreground="red")
+
+    def refresh_receive(self):
+        monitor = self.controller.rx_monitor
+        if monitor is None:
+            self.rx_after_id = None
+            return
+        for arbitration_id, (count, first, last, payload) in monitor.poll().items():
+            name, values = monitor.decode(arbitration_id, payload)
+            rate = (count - 1) / (last - first) if last > first else 0.0
+            decoded = "  ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}" for key, value in values.items())
+            row = (f"0x{arbitration_id:08X}", name or "", count, f"{rate:.1f}", payload.hex(" "), decoded)
+            item = str(arbitration_id)
+            if self.rx_table.exists(item):
+                self.rx_table.item(item, values=row)
+            else:
+                self.rx_table.insert("", tk.END, iid=item, values=row)
+        if monitor.lost:
+            self.rx_status_label.config(text=f"Receive Monitor Status: Listening ({monitor.lost} frames overrun)", foreground="orange")
+        self.rx_after_id = self.root.after(self.rx_refresh_ms, self.refresh_receive)
+
     def quit_application(self, event=None):
-        self.root.destroy()
+        self.on_closing()
         print("Application Quit. Closing GUI")
 
-    def start_engine_rpm_transmission(self):
-        if not self.engine_rpm_transmission_active:
-            self.engine_rpm_transmission_active = True
-            self.engine_rpm_transmission_bus = can.interface.Bus(channel=self.default_can_interface, interface='socketcan')
-            self.engine_rpm_transmission_thread = threading.Thread(target=self.cyclic_engine_rpm_transmission)
-            self.engine_rpm_transmission_thread.start()
-            self.update_status("Engine RPM", "Sending")
-            print("Engine RPM CAN message started.")
-
-    def stop_engine_rpm_transmission(self):
-        if self.engine_rpm_transmission_active:
-            self.engine_rpm_transmission_active = False
-            if self.engine_rpm_transmission_thread:
-                self.engine_rpm_transmission_thread.join()
-            if self.engine_rpm_transmission_bus:
-                self.update_status("Engine RPM", "Idle")
-            print("Engine RPM CAN message stopped.")
-
-    def start_ivt_transmission(self):
-        if not self.ivt_transmission_active:
-            self.ivt_transmission_active = True
-            self.ivt_transmission_thread = threading.Thread(target=self.cyclic_ivt_transmission)
-            self.ivt_transmission_thread.start()
-            self.update_status("IVT", "Sending")
-            print("IVT Status CAN message started.")
-
-    def stop_ivt_transmission(self):
-        if self.ivt_transmission_active:
-            self.ivt_transmission_active = False
-            if self.ivt_transmission_thread:
-                self.ivt_transmission_thread.join()
-            self.update_status("IVT", "Idle")
-            print("IVT Status CAN message stopped.")
-
-    def start_tractor_guidance_transmission(self):
-        if not self.tractor_guidance_transmission_active:
-            self.tractor_guidance_transmission_active = True
-            self.tractor_guidance_transmission_thread = threading.Thread(target=self.cyclic_tractor_guidance_transmission)
-            self.tractor_guidance_transmission_thread.start()
-            self.update_status("Tractor Guidance", "Sending")
-            print("Tractor Guidance CAN message started.")
-
-    def stop_tractor_guidance_transmission(self):
-        if self.tractor_guidance_transmission_active:
-            self.tractor_guidance_transmission_active = False
-            if self.tractor_guidance_transmission_thread:
-                self.tractor_guidance_transmission_thread.join()
-            self.update_status("Tractor Guidance", "Idle")
-            print("Tractor Guidance CAN message stopped.")
-
-    def start_hand_throttle_transmission(self):
-        if not self.hand_throttle_transmission_active:
-            self.hand_throttle_transmission_active = True
-            self.hand_throttle_transmission_thread = threading.Thread(target=self.cyclic_hand_throttle_transmission)
-            self.hand_throttle_transmission_thread.start()
-            self.update_status("Hand Throttle", "Sending")
-            print("Hand Throttle % CAN message started.")
-
-    def stop_hand_throttle_transmission(self):
-        if self.hand_throttle_transmission_active:
-            self.hand_throttle_transmission_active = False
-            if self.hand_throttle_transmission_thread:
-                self.hand_throttle_transmission_thread.join()
-            self.update_status("Hand Throttle", "Idle")
-            print("Hand Throttle % CAN message stopped.")
-
-    def start_set_speed_transmission(self):
-        if not self.set_speed_transmission_active:
-            self.set_speed_transmission_active = True
-            self.set_speed_transmission_thread = threading.Thread(target=self.cyclic_set_speed_transmission)
-            self.set_speed_transmission_thread.start()
-            self.update_status("Set Speed", "Sending")
-            print("Set Speed MPH CAN message started.")
-
-    def stop_set_speed_transmission(self):
-        if self.set_speed_transmission_active:
-            self.set_speed_transmission_active = False
-            if self.set_speed_transmission_thread:
-                self.set_speed_transmission_thread.join()
-            self.update_status("Set Speed", "Idle")
-            print("Set Speed MPH CAN message stopped.")
-
-    def start_tractor_speed_transmission(self):
-        if not self.tractor_speed_transmission_active:
-           self.tractor_speed_transmission_active = True
-           self.tractor_speed_transmission_thread = threading.Thread(target=self.cyclic_tractor_speed_transmission)
-           self.tractor_speed_transmission_thread.start()
-           self.update_status("Tractor Speed", "Sending")
-           print("Tractor Speed CAN message started.")
-
-    def stop_tractor_speed_transmission(self):
-        if self.tractor_speed_transmission_active:
-            self.tractor_speed_transmission_active = False
-            if self.tractor_speed_transmission_thread:
-                 self.tractor_speed_transmission_thread.join()
-            self.update_status("Tractor Speed", "Idle")
-            print("Tractor Speed CAN message stopped.")
+    def update_value(self, message_name, signal_name):
+        # Invalid input keeps the last valid frame on the bus
+        try:
+            self.controller.set_value(message_name, signal_name, self.signal_widgets[(message_name, signal_name)].get())
+        except ValueError:
+            print(f"Invalid {message_name} value entered.")
+
+    def confirm_bus_load(self, message_name, cycle_time_ms):
+        # Asks before a start or cycle-time change that would push the expected load past 100%
+        load = self.controller.bus_load({message_name: cycle_time_ms})
+        if load < 1.0:
+            return True
+        return messagebox.askokcancel("Bus Overload", f"{message_name} at {cycle_time_ms:g} ms puts the expected bus load at "
+                                      f"{format_load(load, self.controller.bitrate)}. Frames will be delayed or dropped. Continue?")
+
+    def update_cycle_time(self, message_name):
+        # Applied to a running message on its next frame; invalid input keeps the current period
+        widget = self.cycle_widgets[message_name]
+        try:
+            cycle_time_ms = float(widget.get())
+            if cycle_time_ms == self.controller.cycle_times_ms[message_name]:
+                return
+            if self.controller.is_active(message_name) and not self.confirm_bus_load(message_name, cycle_time_ms):
+                widget.delete(0, tk.END)
+                widget.insert(0, f"{self.controller.cycle_times_ms[message_name]:g}")
+                return
+            self.controller.set_cycle_time(message_name, cycle_time_ms)
+        except ValueError as e:
+            print(f"Invalid {message_name} cycle time entered: {e}")
+
+    def start_transmission(self, message_name):
+        if not self.controller.is_active(message_name) and not self.confirm_bus_load(message_name, self.controller.cycle_times_ms[message_name]):
+            return
+        try:
+            self.controller.start(message_name)
+        except OSError as e:
+            # python-can reports a missing or down interface as OSError
+            print(f"Could not open {self.controller.channel}: {e}")
+            self.unavailable.add(message_name)
+            self.update_status(message_name, "Interface not available")
+            return
+        self.unavailable.discard(message_name)
+        self.update_status(message_name, "Sending")
+
+    def stop_transmission(self, message_name):
+        self.controller.stop(message_name)
+        self.unavailable.discard(message_name)
+        self.update_status(message_name, "Idle")
 
 
 # Status Labels
 
-    def update_status(self, message_type, status):
-        if message_type == "Engine RPM":
-            self.original_status_label.config(text=f"Engine RPM CAN Message Status: {status}", foreground="green" if status == "Sending" else "red")
-        elif message_type == "IVT":
-            self.ivt_status_label.config(text=f"IVT Status CAN Message Status: {status}", foreground="green" if status == "Sending" else "red")
-        elif message_type == "Tractor Guidance":
-            self.tractor_guidance_status_label.config(text=f"Tractor Guidance CAN Message Status: {status}", foreground="green" if status == "Sending" else "red")
-        elif message_type == "Hand Throttle":
-            self.hand_throttle_status_label.config(text=f"Hand Throttle % CAN Message Status: {status}", foreground="green" if status == "Sending" else "red")
-        elif message_type == "Set Speed":
-            self.set_speed_status_label.config(text=f"Set Speed MPH CAN Message Status: {status}", foreground="green" if status == "Sending" else "red")
-        elif message_type == "Tractor Speed":
-            self.tractor_speed_status_label.config(text=f"Set Tractor Speed CAN Message Status: {status}", foreground="green" if status == "Sending" else "red") 
-
-# CAN message Defenitions
-
-    def cyclic_engine_rpm_transmission(self):
-        bus = can.interface.Bus(channel=self.default_can_interface, interface='socketcan')
-        while self.engine_rpm_transmission_active:
-            rpm_value = self.rpm_entry.get() or "0"
-            rpm = int(rpm_value)
-            rpm_data = int(rpm / 0.125)
-            message = can.Message(
-                arbitration_id=0x0CF004FE,
-                data=[0, 0, 0, rpm_data & 0xFF, (rpm_data >> 8) & 0xFF, 0, 0, 0],
-                is_extended_id=True
-            )
-            try:
-                bus.send(message)
-            except can.CanError:
-                print("Failed to send Engine RPM CAN message")
-            except ValueError:
-                print("Invalid Engine RPM value entered.")
-            time.sleep(self.default_cycle_time_ms / 1000)
-
-    def cyclic_ivt_transmission(self):
-        bus = can.interface.Bus(channel=self.default_can_interface, interface='socketcan')
-        while self.ivt_transmission_active:
-            ivt_status_value = 0xCD if self.ivt_status_var.get() == "Parked" else 0xCC
-            message = can.Message(
-                arbitration_id=0x0CFFFE03,
-                data=[0, 0, 0, ivt_status_value, 0, 0, 0, 0],
-                is_extended_id=True
-            )
-            try:
-                bus.send(message)
-            except can.CanError:
-                print("Failed to send IVT Status CAN message")
-            time.sleep(self.default_cycle_time_ms / 1000)
-
-    def cyclic_tractor_guidance_transmission(self):
-        bus = can.interface.Bus(channel=self.default_can_interface, interface='socketcan')
-        while self.tractor_guidance_transmission_active:
-            try:
-                guidance_value = self.tractor_guidance_entry.get() or "0"
-                guidance = float(guidance_value)
-                guidance_data = int((guidance * .25) - (8352 * 4))
-                message = can.Message(
-                    arbitration_id=0x0CAC00FE,
-                    data=[guidance_data & 0xFF, (guidance_data >> 8) & 0xFF, 0, 0, 0, 0, 0, 0],
-                    is_extended_id=True
-                )
-                bus.send(message)
-            except can.CanError:
-                print("Failed to send Tractor Guidance CAN message")
-            except ValueError:
-                print("Invalid Tractor Guidance value entered.")
-            time.sleep(self.default_cycle_time_ms / 1000)
-
-    def cyclic_hand_throttle_transmission(self):
-        bus = can.interface.Bus(channel=self.default_can_interface, interface='socketcan')
-        while self.hand_throttle_transmission_active:
-            throttle_value = self.hand_throttle_entry.get() or "0"
-            try:
-                throttle = float(throttle_value)
-                throttle_data = int(throttle / 0.4)
-                message = can.Message(
-                    arbitration_id=0x0CFFFF8C,
-                    data=[0x4D, 0, 0, throttle_data & 0xFF, (throttle_data >> 8) & 0xFF, 0, 0, 0],
-                    is_extended_id=True
-                )
-                bus.send(message)
-            except can.CanError:
-                print("Failed to send Hand Throttle % CAN message")
-            except ValueError:
-                print("Invalid Hand Throttle % value entered.")
-            time.sleep(self.default_cycle_time_ms / 1000)
-
-    def cyclic_set_speed_transmission(self):
-        bus = can.interface.Bus(channel=self.default_can_interface, interface='socketcan')
-        while self.set_speed_transmission_active:
-            try:
-                f1_value = self.f1_entry.get() or "10.0"
-                f2_value = self.f2_entry.get() or "31.0"
-                f1 = float(f1_value)
-                f2 = float(f2_value)
-                f1_data = int(f1 / 0.00124277943490)
-                f2_data = int(f2 / 0.00124277943490)
-                message = can.Message(
-                    arbitration_id=0x18FFFF05,
-                    data=[0x20, f1_data & 0xFF, (f1_data >> 8) & 0xFF, f2_data & 0xFF, (f2_data >> 8) & 0xFF, 0, 0, 0],
-                    is_extended_id=True
-                )
-                try:
-                    bus.send(message)
-                except can.CanError:
-                    print("Failed to send Set Speed MPH CAN message")
-                time.sleep(self.default_cycle_time_ms / 1000)
-            except ValueError:
-                print("Invalid Set Speed MPH value")
-
-    def cyclic_tractor_speed_transmission(self):
-         bus = can.interface.Bus(channel=self.default_can_interface, interface='socketcan')
-         while self.tractor_speed_transmission_active:
-            speed_value = self.tractor_speed_entry.get() or "0"
-            try:
-                 speed = float(speed_value)
-                 speed_data = int((speed * 3.6) / 0.00390625)
-                 message = can.Message(
-                     arbitration_id=0x18FEF1FE,
-                     data=[0, speed_data & 0xFF, (speed_data >> 8) & 0xFF, 0, 0, 0, 0, 0],
-                     is_extended_id=True
-                 )
-                 bus.send(message)
-            except can.CanError:
-                 print("Failed to send Tractor Speed (m/s) CAN message")
-            except ValueError:
-                 print("Invalid Tractor Speed (m/s) value entered.")
-            time.sleep(self.default_cycle_time_ms / 1000)
-
-
-    def update_ivt_status(self, event):
-        if self.ivt_transmission_active:
-            self.stop_ivt_transmission()
-            self.start_ivt_transmission()
+    def update_status(self, message_name, status, foreground=None):
+        self.status_labels[message_name].config(text=f"{message_name} CAN Message Status: {status}", foreground=foreground or ("red" if status == "Idle" else "green"))
+
+    def sync_widgets(self):
+        # Values and cycle times changed elsewhere (control server, profile) show up in the fields;
+        # the field being edited is left alone
+        focused = self.root.focus_get()
+        for (message_name, signal_name), widget in self.signal_widgets.items():
+            text = str(self.controller.values[message_name][signal_name])
+            if widget is focused or widget.get() == text:
+                continue
+            if self.controller.messages[message_name].signals[signal_name].choices:
+                widget.set(text)
+            else:
+                widget.delete(0, tk.END)
+                widget.insert(0, text)
+        for message_name, widget in self.cycle_widgets.items():
+            text = f"{self.controller.cycle_times_ms[message_name]:g}"
+            if widget is not focused and widget.get() != text:
+                widget.delete(0, tk.END)
+                widget.insert(0, text)
+
+    def refresh_stats(self):
+        # Every label is rewritten, so messages started or stopped through the control server show up too
+        stats_by_message = self.controller.stats_snapshot()
+        for message_name in self.controller.messages:
+            if not self.controller.is_active(message_name):
+                self.update_status(message_name, "Interface not available" if message_name in self.unavailable else "Idle")
+                continue
+            self.unavailable.discard(message_name)
+            stats = stats_by_message.get(message_name)
+            if stats is None:
+                self.update_status(message_name, "Sending (kernel BCM)")
+                continue
+            # Orange as soon as the period slips by more than 10% or a send fails
+            slipping = stats["errors"] or stats["jitter_max_ms"] > 0.1 * stats["period_ms"]
+            self.update_status(message_name, "Sending\n" + format_stats(stats), "orange" if slipping else "green")
+        load = self.controller.bus_load()
+        self.bus_load_label.config(text=f"Expected Bus Load: {format_load(load, self.controller.bitrate)}",
+                                   foreground="red" if load >= 1.0 else "orange" if load >= LOAD_WARNING else "")
+        progress = self.controller.profile_progress()
+        if progress is not None:
+            self.profile_status_label.config(text=f"Profile Status: {'Finished' if progress >= 1 else 'Running'} {progress:.0%}", foreground="green")
+        replay = self.controller.replay
+        if replay is not None:
+            state = "Finished" if replay.finished else "Replaying"
+            self.replay_status_label.config(text=f"Replay Status: {state}  sent {replay.sent}  overridden {replay.skipped}  err {replay.errors}",
+                                            foreground="red" if replay.finished else "green")
+        self.sync_widgets()
+        if self.session is not None:
+            self.session.update()
+        self.root.after(self.stats_refresh_ms, self.refresh_stats)
 
     def on_closing(self):
-        self.stop_engine_rpm_transmission()
-        self.stop_ivt_transmission()
-        self.stop_tractor_guidance_transmission()
-        self.stop_hand_throttle_transmission()
-        self.stop_tractor_speed_transmission()
+        if self.session is not None:
+            self.session.update()
+        self.controller.shutdown()
         self.root.destroy()
 
-if __name__ == "__main__":
+def run_gui(controller, session=None):
+    global tk, ttk, messagebox
+    import tkinter as tk
+    from tkinter import ttk, messagebox
+
     print("Starting GUI application.")
+    # Redirect standard error to suppress specific messages (Tk/X noise); CLI and startup errors before this
+    # point still reach the terminal
+    sys.stderr = open(os.devnull, 'w')
     root = tk.Tk()
-    app = CanApp(root)
+    app = CanApp(root, controller, session)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
+    print(f"GUI ready {(time.perf_counter() - LAUNCHED) * 1000:.0f} ms after start.")
     root.mainloop()
     print("GUI application closed.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Tractor CAN message GUI")
+    parser.add_argument("--headless", action="store_true", help="run only the transmit engine, controlled from stdin/signals")
+    parser.add_argument("--fleet", metavar="CHANNELS", help="comma separated channels; simulate one tractor per channel, one process each (headless)")
+    parser.add_argument("--config", help="JSON config with interface, message values, cycle times and active messages (instead of the last session)")
+    parser.add_argument("--session", default=DEFAULT_SESSION, help=f"session file, restored at launch and saved on every change (default {DEFAULT_SESSION})")
+    parser.add_argument("--no-session", action="store_true", help="neither restore nor save the session")
+    parser.add_argument("--interface", help="CAN channel (default can0)")
+    parser.add_argument("--bustype", help="python-can interface type (default socketcan)")
+    parser.add_argument("--bitrate", type=int, help="bus bitrate for the bus load estimate (default 250000)")
+    parser.add_argument("--bcm", action="store_true", help="offload cyclic transmission to the SocketCAN broadcast manager")
+    parser.add_argument("--database", help="message definitions (.json, .yaml or .dbc)")
+    parser.add_argument("--set", action="append", default=[], metavar="MESSAGE.SIGNAL=VALUE", help="initial signal value")
+    parser.add_argument("--cycle-time", action="append", default=[], metavar="MESSAGE=MS", help="cycle time for a message")
+    parser.add_argument("--start", action="append", default=[], metavar="MESSAGE", help="start this message at launch")
+    parser.add_argument("--rx-all", action="store_true", help="receive every frame instead of only the database IDs (no kernel filters)")
+    parser.add_argument("--j1939-responder", action="store_true", help="answer J1939 requests and address claims for the emulated ECUs")
+    parser.add_argument("--record", metavar="PATH", help="record sent and received frames to this binary trace file")
+    parser.add_argument("--record-tx-only", action="store_true", help="record only the frames this app sends")
+    parser.add_argument("--record-max-mb", type=float, help="rotate the trace file after this many megabytes")
+    parser.add_argument("--record-max-minutes", type=float, help="rotate the trace file after this many minutes")
+    parser.add_argument("--replay", metavar="PATH", help="replay a trace (.tcr recording, candump .log, .asc, .blf) at launch")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay speed factor (e.g. 0.5, 1, 10)")
+    parser.add_argument("--replay-include", default="", metavar="IDS", help="comma separated hex IDs to replay (default all)")
+    parser.add_argument("--replay-exclude", default="", metavar="IDS", help="comma separated hex IDs to leave out of the replay")
+    parser.add_argument("--profile", metavar="PATH", help="run a drive-cycle profile (JSON) at launch")
+    parser.add_argument("--control", metavar="ADDRESS", help="serve the JSON-lines control API on unix:/path or tcp:127.0.0.1:PORT")
+    parser.add_argument("--stats-log", help="periodically dump per-message timing stats to this .csv or .jsonl file")
+    parser.add_argument("--stats-interval", type=float, default=1.0, help="seconds between stats dumps")
+    args = parser.parse_args()
+    if not 0 < args.replay_speed < float("inf"):
+        parser.error("--replay-speed must be a positive number")
+
+    # The config file, or else the last session; CLI flags override either
+    use_session = not (args.no_session or args.fleet)
+    if args.config:
+        from headless import load_config
+        config = load_config(args.config)
+    else:
+        config = load_session(args.session) if use_session else {}
+    for key in ("interface", "bustype", "database", "bitrate"):
+        if getattr(args, key):
+            config[key] = getattr(args, key)
+    for key in ("bcm", "rx_all", "j1939_responder"):
+        if getattr(args, key):
+            config[key] = True
+    # The session's active frames go back on the bus before python-can is even imported (--set values follow
+    # once the controller takes over)
+    cold_start = ColdStart.start(config) if not args.fleet else None
+    imports_started = time.perf_counter()
+    from headless import build_controller, parse_assignment, parse_id_list, run_headless
+    import_ms = (time.perf_counter() - imports_started) * 1000
+    messages = config.setdefault("messages", {})
+    try:
+        for assignment in args.set:
+            message_name, signal_name, value = parse_assignment(assignment)
+            messages.setdefault(message_name, {}).setdefault("values", {})[signal_name] = value
+        for assignment in args.cycle_time:
+            message_name, cycle_time_ms = assignment.rsplit("=", 1)
+            messages.setdefault(message_name, {})["cycle_time_ms"] = float(cycle_time_ms)
+    except ValueError as e:
+        parser.error(f"bad --set/--cycle-time {assignment!r}: {e}")
+    for message_name in args.start:
+        messages.setdefault(message_name, {})["active"] = True
+
+    if args.fleet:
+        from fleet import Fleet, apply_fleet_config, run_fleet
+        from signal_db import load_database, DEFAULT_DATABASE
+        fleet = Fleet(args.fleet.split(","), load_database(config.get("database", DEFAULT_DATABASE)), config.get("bustype", "socketcan"))
+        apply_fleet_config(fleet, config)
+        run_fleet(fleet)
+        return
+
+    controller = build_controller(config, cold_start.stop() if cold_start is not None else None)
+    report = f"Startup: engine running {(time.perf_counter() - LAUNCHED) * 1000:.0f} ms after start (python-can and engine imported in {import_ms:.0f} ms"
+    if cold_start is not None and cold_start.first_sent is not None:
+        report += f", first restored frame after {(cold_start.first_sent - LAUNCHED) * 1000:.0f} ms, {cold_start.sent} sent before the scheduler took over"
+    print(report + ")")
+    # Messages that should be running but are not (the interface could not be opened) stay active in the session
+    unstarted = [name for name, settings in messages.items()
+                 if settings.get("active") and name in controller.messages and not controller.is_active(name)]
+    session = SessionSaver(args.session, controller, config, unstarted,
+                           config.get("j1939_responder") and controller.responder is None) if use_session else None
+    if args.record:
+        controller.start_recording(args.record, include_rx=not args.record_tx_only,
+                                   max_bytes=args.record_max_mb * 1e6 if args.record_max_mb else None,
+                                   max_seconds=args.record_max_minutes * 60 if args.record_max_minutes else None)
+    if args.replay:
+        controller.start_replay(args.replay, args.replay_speed, parse_id_list(args.replay_include), parse_id_list(args.replay_exclude))
+    if args.profile:
+        controller.start_profile(args.profile)
+    control_server = None
+    if args.control:
+        from control_server import ControlServer
+        try:
+            control_server = ControlServer(controller, args.control)
+        except (OSError, ValueError) as e:
+            # The messages are already on the bus; keep them running without the control API
+            print(f"Control server not started on {args.control}: {e}")
+    stats_logger = StatsLogger(args.stats_log, controller.stats_snapshot, args.stats_interval) if args.stats_log else None
+    if args.headless:
+        run_headless(controller, session)
+    else:
+        run_gui(controller, session)
+    if stats_logger is not None:
+        stats_logger.stop()
+    if control_server is not None:
+        control_server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#Local control API so test automation can drive the transmit engine without the GUI.
+#An asyncio server on a Unix socket or loopback TCP port (run in its own thread next to the GUI or headless
+#mode) speaks newline-delimited JSON. Value changes go straight to TractorController.set_values and take
+#effect on the next cycle; nothing is restarted.
+#
+#Requests (an optional "id" is echoed back in the reply):
+#    {"op": "set", "message": "Engine RPM", "values": {"engine_speed": 1500}}
+#    {"op": "start", "message": "Engine RPM"}          {"op": "stop", "message": "Engine RPM"}
+#    {"op": "cycle", "message": "Engine RPM", "ms": 20}
+#    {"op": "get"}                                     -> {"ok": true, "values": {...}, "active": [...]}
+#    {"op": "subscribe", "interval": 0.5}              -> {"event": "stats", "tx": {...}, "rx": {...}} every interval
+#    {"op": "unsubscribe"}
+#Replies are {"ok": true, ...} or {"ok": false, "error": "..."}.
+
+import asyncio
+import errno
+import ipaddress
+import json
+import os
+import socket
+import stat
+import threading
+
+# Fastest stats subscription; keeps a client from turning the publisher into a busy loop
+MIN_INTERVAL_S = 0.01
+
+
+def parse_address(address):
+    # "unix:/tmp/tractor.sock" or "tcp:127.0.0.1:8765" (a bare path means a Unix socket). The API has no
+    # authentication, so TCP is loopback only; raises ValueError for any other host.
+    kind, _, rest = address.partition(":")
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        host = host.strip("[]") or "127.0.0.1"
+        if host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+            raise ValueError(f"control server host must be a loopback address, not {host}")
+        return "tcp", (host, int(port))
+    return "unix", rest if kind == "unix" else address
+
+
+def remove_socket(path):
+    # Removes a stale Unix socket; anything else at the path (a typo like --control session.json) is left alone
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(errno.EEXIST, f"{path} exists and is not a socket")
+    os.unlink(path)
+
+
+class ControlServer:
+    def __init__(self, controller, address):
+        self.controller = controller
+        self.kind, self.address = parse_address(address)
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        # Set by the server thread when the socket cannot be opened (port in use, bad path)
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="can-control", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+        print(f"Control server listening on {address}")
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        if self.kind == "unix":
+            try:
+                remove_socket(self.address)
+            except OSError:
+                pass
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            if self.kind == "unix":
+                remove_socket(self.address)
+                start = asyncio.start_unix_server(self._handle_client, path=self.address)
+            else:
+                host, port = self.address
+                start = asyncio.start_server(self._handle_client, host=host, port=port)
+            self._server = self._loop.run_until_complete(start)
+        except OSError as e:
+            self._error = e
+            self._loop.close()
+            return
+        finally:
+            # The constructor waits for this either way
+            self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    async def _handle_client(self, reader, writer):
+        if self.kind == "tcp":
+            writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        subscription = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = {}
+                try:
+                    request = json.loads(line)
+                    op = request.get("op")
+                    if op == "subscribe":
+                        interval = float(request.get("interval", 0.5))
+                        if not MIN_INTERVAL_S <= interval < float("inf"):
+                            raise ValueError(f"interval must be at least {MIN_INTERVAL_S:g} s")
+                        if subscription is not None:
+                            subscription.cancel()
+                        subscription = asyncio.ensure_future(self._publish(writer, interval))
+                        reply = {"ok": True}
+                    elif op == "unsubscribe":
+                        if subscription is not None:
+                            subscription.cancel()
+                            subscription = None
+                        reply = {"ok": True}
+                    else:
+                        reply = self.handle_request(request)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    request = request if isinstance(request, dict) else {}
+                    reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                if "id" in request:
+                    reply["id"] = request["id"]
+                writer.write(json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if subscription is not None:
+                subscription.cancel()
+            writer.close()
+
+    def handle_request(self, request):
+        # Raises ValueError/KeyError for bad requests; the caller turns them into error replies
+        controller = self.controller
+        op = request.get("op")
+        if op == "set":
+            controller.set_values(request["message"], request["values"])
+            return {"ok": True}
+        if op == "start":
+            controller.start(request["message"])
+            return {"ok": True}
+        if op == "stop":
+            controller.stop(request["message"])
+            return {"ok": True}
+        if op == "cycle":
+            controller.set_cycle_time(request["message"], float(request["ms"]))
+            return {"ok": True}
+        if op == "get":
+            return {"ok": True, "values": controller.values,
+                    "active": [name for name in controller.messages if controller.is_active(name)],
+                    "cycle_times_ms": controller.cycle_times_ms}
+        raise ValueError(f"unknown op {op!r}")
+
+    def stats_event(self):
+        rx = {}
+        monitor = self.controller.rx_monitor
+        if monitor is not None:
+            for arbitration_id, (count, first, last, payload) in list(monitor.poll().items()):
+                rx[f"0x{arbitration_id:08X}"] = {"count": count, "last": last, "data": payload.hex()}
+        return {"event": "stats", "tx": self.controller.stats_snapshot(), "rx": rx}
+
+    async def _publish(self, writer, interval):
+        while True:
+            writer.write(json.dumps(self.stats_event(), separators=(",", ":")).encode() + b"\n")
+            await writer.drain()
+            await asyncio.sleep(interval)
+
+
+class ControlClient:
+    # Minimal blocking client for test harnesses: client.call("set", message="Engine RPM", values={...})
+    def __init__(self, address):
+        kind, address = parse_address(address)
+        if kind == "unix":
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.connect(address)
+        self.file = self.sock.makefile("rb")
+
+    def send(self, op, **fields):
+        self.sock.sendall(json.dumps(dict(fields, op=op), separators=(",", ":")).encode() + b"\n")
+
+    def receive(self):
+        return json.loads(self.file.readline())
+
+    def call(self, op, **fields):
+        # Skips stats events that arrive while waiting for the reply
+        self.send(op, **fields)
+        while True:
+            reply = self.receive()
+            if "event" not in reply:
+                return reply
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
@@ -0,0 +1,290 @@
+#Fleet mode: simulates one tractor per CAN interface (can0..can3, dozens of vcans) with one transmit-engine
+#worker process per interface, so adding interfaces scales across cores instead of sharing one GIL.
+#The parent encodes values and writes them into a multiprocessing.shared_memory control block
+#(enable flag, cycle time and payload per interface/message, guarded by a sequence counter); each worker
+#polls its row, drives its own TxScheduler and writes its throughput and jitter back into the same block.
+
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from tractor_controller import MIN_CYCLE_TIME_MS
+
+CONTROL_DTYPE = np.dtype([
+    ("enabled", "u1"),
+    ("seq", "u4"),
+    ("cycle_time_ms", "f8"),
+    ("payload", "u1", 8),
+    ("dlc", "u1"),
+    # Written by the worker
+    ("sent", "u8"),
+    ("errors", "u8"),
+    ("jitter_p99_ms", "f8"),
+    ("jitter_max_ms", "f8"),
+])
+INTERFACE_DTYPE = np.dtype([("running", "u1"), ("alive", "u1"), ("frames_per_s", "f8")])
+
+POLL_S = 0.01
+STATS_S = 0.5
+
+
+def _layout(buffer, interface_count, message_count):
+    control = np.ndarray((interface_count, message_count), dtype=CONTROL_DTYPE, buffer=buffer)
+    interfaces = np.ndarray((interface_count,), dtype=INTERFACE_DTYPE, buffer=buffer, offset=control.nbytes)
+    return control, interfaces
+
+
+def _worker(shm_name, index, interface_count, channel, bustype, message_specs):
+    # message_specs: [(name, arbitration_id, is_extended_id)] in control block column order
+    import can
+    from tx_scheduler import TxScheduler
+
+    # The parent owns and unlinks the block; workers only attach and close
+    shm = shared_memory.SharedMemory(name=shm_name)
+    control, interfaces = _layout(shm.buf, interface_count, len(message_specs))
+    row = control[index]
+    scheduler = TxScheduler(channel, interface=bustype)
+    interfaces[index]["alive"] = 1
+
+    seen_seq = [None] * len(message_specs)
+    seen_cycle = [None] * len(message_specs)
+    messages = [None] * len(message_specs)
+    last_stats = time.monotonic()
+    last_sent = 0
+    try:
+        while interfaces[index]["running"]:
+            if not scheduler.is_alive():
+                # The send thread died: report the interface as down instead of running at 0 frames/s
+                print(f"{channel}: transmit thread stopped")
+                break
+            for column, (name, arbitration_id, is_extended_id) in enumerate(message_specs):
+                entry = row[column]
+                seq = int(entry["seq"])
+                # Odd sequence means the parent is mid-write; pick it up on the next poll
+                if seq != seen_seq[column] and not seq & 1:
+                    payload = entry["payload"][:entry["dlc"]].tobytes()
+                    if int(entry["seq"]) == seq:
+                        seen_seq[column] = seq
+                        messages[column] = can.Message(arbitration_id=arbitration_id, data=payload, is_extended_id=is_extended_id)
+                        scheduler.update(name, messages[column])
+                cycle_time_ms = float(entry["cycle_time_ms"])
+                enabled = bool(entry["enabled"]) and messages[column] is not None
+                if enabled and not scheduler.is_active(name):
+                    scheduler.start(name, messages[column], cycle_time_ms / 1000)
+                    seen_cycle[column] = cycle_time_ms
+                elif enabled and cycle_time_ms != seen_cycle[column]:
+                    scheduler.set_period(name, cycle_time_ms / 1000)
+                    seen_cycle[column] = cycle_time_ms
+                elif not enabled and scheduler.is_active(name):
+                    scheduler.stop(name)
+
+            now = time.monotonic()
+            if now - last_stats >= STATS_S:
+                snapshot = scheduler.stats_snapshot()
+                total = 0
+                for column, (name, _, _) in enumerate(message_specs):
+                    stats = snapshot.get(name)
+                    if stats is None:
+                        continue
+                    row[column]["sent"] = stats["sent"]
+                    row[column]["errors"] = stats["errors"]
+                    row[column]["jitter_p99_ms"] = stats["jitter_p99_ms"]
+                    row[column]["jitter_max_ms"] = stats["jitter_max_ms"]
+                    total += stats["sent"]
+                interfaces[index]["frames_per_s"] = max(0, total - last_sent) / (now - last_stats)
+                last_sent = total
+                last_stats = now
+            time.sleep(POLL_S)
+    finally:
+        scheduler.shutdown()
+        interfaces[index]["alive"] = 0
+        del control, interfaces, row
+        shm.close()
+
+
+class Fleet:
+    def __init__(self, channels, messages, bustype="socketcan"):
+        self.channels = list(channels)
+        # The control block holds 8 byte payloads, so multi-packet (transport protocol) messages are left out
+        self.messages = {message.name: message for message in messages if message.definition.dlc <= 8}
+        self.columns = {name: column for column, name in enumerate(self.messages)}
+        # One set of values per simulated tractor
+        self.values = [{name: message.default_values() for name, message in self.messages.items()} for _ in self.channels]
+
+        size = CONTROL_DTYPE.itemsize * len(self.channels) * len(self.messages) + INTERFACE_DTYPE.itemsize * len(self.channels)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.control, self.interfaces = _layout(self.shm.buf, len(self.channels), len(self.messages))
+        self.control[:] = 0
+        self.interfaces[:] = 0
+        for index in range(len(self.channels)):
+            for name, message in self.messages.items():
+                self.control[index, self.columns[name]]["cycle_time_ms"] = message.definition.cycle_time_ms
+                self._write_payload(index, name)
+
+        message_specs = [(name, message.arbitration_id, message.is_extended_id) for name, message in self.messages.items()]
+        context = multiprocessing.get_context("spawn")
+        self.processes = []
+        for index, channel in enumerate(self.channels):
+            self.interfaces[index]["running"] = 1
+            process = context.Process(target=_worker, name=f"can-fleet-{channel}", daemon=True,
+                                      args=(self.shm.name, index, len(self.channels), channel, bustype, message_specs))
+            process.start()
+            self.processes.append(process)
+
+    def _indices(self, index):
+        return range(len(self.channels)) if index is None else [index]
+
+    def _write_payload(self, index, message_name):
+        entry = self.control[index, self.columns[message_name]]
+        payload = self.messages[message_name].encode(self.values[index][message_name])
+        entry["seq"] += 1
+        entry["payload"][:len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+        entry["dlc"] = len(payload)
+        entry["seq"] += 1
+
+    def set_values(self, index, message_name, values):
+        # index None applies to every tractor; raises ValueError for rejected values
+        message = self.messages[message_name]
+        parsed = {name: message.signals[name].parse(value) for name, value in values.items()}
+        for i in self._indices(index):
+            self.values[i][message_name].update(parsed)
+            self._write_payload(i, message_name)
+
+    def set_value(self, index, message_name, signal_name, value):
+        self.set_values(index, message_name, {signal_name: value})
+
+    def set_cycle_time(self, index, message_name, cycle_time_ms):
+        # Same floor as TractorController.set_cycle_time; raises ValueError below MIN_CYCLE_TIME_MS
+        cycle_time_ms = float(cycle_time_ms)
+        if not cycle_time_ms >= MIN_CYCLE_TIME_MS:
+            raise ValueError(f"cycle time must be at least {MIN_CYCLE_TIME_MS:g} ms")
+        column = self.columns[message_name]
+        for i in self._indices(index):
+            self.control[i, column]["cycle_time_ms"] = cycle_time_ms
+
+    def start(self, index, message_name):
+        for i in self._indices(index):
+            self.control[i, self.columns[message_name]]["enabled"] = 1
+
+    def stop(self, index, message_name):
+        for i in self._indices(index):
+            self.control[i, self.columns[message_name]]["enabled"] = 0
+
+    def stats(self):
+        # [{channel, alive, frames_per_s, messages: {name: {...}}}] read straight from the control block
+        result = []
+        for index, channel in enumerate(self.channels):
+            messages = {}
+            for name, column in self.columns.items():
+                entry = self.control[index, column]
+                if entry["enabled"]:
+                    messages[name] = {"sent": int(entry["sent"]), "errors": int(entry["errors"]),
+                                      "jitter_p99_ms": float(entry["jitter_p99_ms"]), "jitter_max_ms": float(entry["jitter_max_ms"])}
+            result.append({"channel": channel, "alive": bool(self.interfaces[index]["alive"]),
+                           "frames_per_s": float(self.interfaces[index]["frames_per_s"]), "messages": messages})
+        return result
+
+    def shutdown(self):
+        self.interfaces["running"] = 0
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        del self.control, self.interfaces
+        self.shm.close()
+        self.shm.unlink()
+
+
+FLEET_HELP = """Fleet commands (<target> is a channel name or 'all'):
+  start <target> <message>
+  stop <target> <message>
+  set <target> <message>.<signal>=<value>
+  cycle <target> <message>=<ms>
+  stats
+  quit"""
+
+
+def apply_fleet_config(fleet, config):
+    # Same "messages" section as the headless config, applied to every tractor
+    for name, settings in config.get("messages", {}).items():
+        if name not in fleet.messages:
+            print(f"Unknown message in config: {name}")
+            continue
+        try:
+            if "values" in settings:
+                fleet.set_values(None, name, settings["values"])
+            if "cycle_time_ms" in settings:
+                fleet.set_cycle_time(None, name, settings["cycle_time_ms"])
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"Skipped {name} settings from config: {e}")
+            continue
+        if settings.get("active"):
+            fleet.start(None, name)
+
+
+def print_fleet_stats(fleet):
+    for interface in fleet.stats():
+        state = "running" if interface["alive"] else "down"
+        print(f"{interface['channel']} [{state}] {interface['frames_per_s']:.1f} frames/s")
+        for name, stats in interface["messages"].items():
+            print(f"  {name}: sent {stats['sent']}  err {stats['errors']}  "
+                  f"jitter p99/max {stats['jitter_p99_ms']:.2f}/{stats['jitter_max_ms']:.2f} ms")
+
+
+def handle_fleet_command(fleet, line):
+    # Returns False when the command asks to quit
+    from headless import parse_assignment
+    command, _, argument = line.strip().partition(" ")
+    target, _, rest = argument.strip().partition(" ")
+    try:
+        index = None if target == "all" else fleet.channels.index(target) if target else None
+        if command == "start":
+            fleet.start(index, rest.strip())
+        elif command == "stop":
+            fleet.stop(index, rest.strip())
+        elif command == "set":
+            message_name, signal_name, value = parse_assignment(rest)
+            fleet.set_value(index, message_name, signal_name, value)
+        elif command == "cycle":
+            message_name, cycle_time_ms = rest.rsplit("=", 1)
+            fleet.set_cycle_time(index, message_name.strip(), float(cycle_time_ms))
+        elif command == "stats":
+            print_fleet_stats(fleet)
+        elif command in ("quit", "exit"):
+            return False
+        elif command:
+            print(FLEET_HELP)
+    except KeyError as e:
+        print(f"Unknown message or signal: {e}")
+    except ValueError as e:
+        print(f"Invalid command {line.strip()!r}: {e}")
+    return True
+
+
+def run_fleet(fleet):
+    import signal
+    import sys
+    import threading
+
+    stop_event = threading.Event()
+
+    def read_commands():
+        for line in sys.stdin:
+            if not handle_fleet_command(fleet, line):
+                stop_event.set()
+                return
+            sys.stdout.flush()
+
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGUSR1, lambda signum, frame: print_fleet_stats(fleet))
+
+    print(f"Fleet running on {', '.join(fleet.channels)}. Type 'help' for commands.")
+    sys.stdout.flush()
+    threading.Thread(target=read_commands, name="stdin-commands", daemon=True).start()
+    while not stop_event.wait(0.5):
+        pass
+    fleet.shutdown()
+    print("Fleet stopped.")
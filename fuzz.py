@@ -0,0 +1,278 @@
+#Fuzz and sweep generator for ECU robustness testing.
+#Cases are pregenerated as one NumPy table (ID, DLC, kind, signal, payload) from the message database and/or
+#an ID range: a sweep over each signal's full raw range (every other signal at its current value), boundary
+#values (0, 1, mid, max-1, max and just outside the physical limits) and seeded random payloads. The table is
+#packed into raw SocketCAN frames up front, so sending is one socket.send() of a preformatted 16 byte row per
+#frame, back to back at whatever rate the bus accepts (ENOBUFS backs off) with an optional on/off duty cycle.
+#Every run saves its case table and per-case send times to an .npz file, so the case index printed or logged
+#around an ECU crash can be sent again on its own:
+#
+#    python fuzz.py run --interface can0 --modes sweep,boundary,random --seed 7 --duty 0.5 --log fuzz_run.npz
+#    python fuzz.py run --interface can0 --ids 0x18FF0000-0x18FF00FF --modes random --random 1000
+#    python fuzz.py replay fuzz_run.npz 120345:120360 --interface can0
+
+import argparse
+import errno
+import socket
+import time
+
+import can
+import numpy as np
+
+from signal_db import load_database, DEFAULT_DATABASE
+
+CASE_DTYPE = np.dtype([("arbitration_id", "<u4"), ("is_extended_id", "?"), ("dlc", "u1"), ("kind", "u1"), ("signal", "u1"), ("data", "u1", 8)])
+KINDS = ("sweep", "boundary", "random")
+KIND_SWEEP, KIND_BOUNDARY, KIND_RANDOM = range(3)
+# signal column for cases that are not tied to one signal
+NO_SIGNAL = 0xFF
+
+CAN_EFF_FLAG = 0x80000000
+# struct can_frame: 32 bit ID with flags, 8 bit DLC, 3 pad bytes, 8 data bytes
+CAN_FRAME_DTYPE = np.dtype([("can_id", "<u4"), ("dlc", "u1"), ("pad", "u1", 3), ("data", "u1", 8)])
+# Filler payloads for IDs without a signal definition
+BOUNDARY_BYTES = (0x00, 0xFF, 0x55, 0xAA, 0x7F, 0x80)
+# Largest number of sweep cases per signal (a full 16 bit field)
+MAX_SWEEP = 1 << 16
+
+
+def _cases(arbitration_id, is_extended_id, kind, payloads, signal=NO_SIGNAL):
+    cases = np.zeros(len(payloads), dtype=CASE_DTYPE)
+    cases["arbitration_id"] = arbitration_id
+    cases["is_extended_id"] = is_extended_id
+    cases["dlc"] = payloads.shape[1]
+    cases["kind"] = kind
+    cases["signal"] = signal
+    cases["data"][:, :payloads.shape[1]] = payloads
+    return cases
+
+
+def _boundary_raws(signal):
+    mask = signal.mask
+    raws = {0, 1, mask >> 1, (mask >> 1) + 1, mask - 1, mask}
+    if not signal.choices:
+        for limit, step in ((signal.minimum, -1), (signal.maximum, 1)):
+            if limit is not None:
+                raw = signal.to_raw(limit)
+                raws.update({raw, (raw + step) & mask})
+    else:
+        raws.update(signal.choices.values())
+    return np.array(sorted(raws), dtype=np.uint64)
+
+
+def message_cases(message, base_payload, modes, rng, sweep_step=1, random_count=256, max_sweep=MAX_SWEEP):
+    # Cases for one database message; base_payload holds the values of the signals not being varied
+    parts = []
+    for index, signal in enumerate(message.definition.signals):
+        if "sweep" in modes:
+            # Wide fields are swept with a coarser step so one signal never exceeds max_sweep cases
+            step = max(sweep_step, -(-(signal.mask + 1) // max_sweep))
+            raws = np.arange(0, signal.mask + 1, step, dtype=np.uint64)
+            parts.append(_cases(message.arbitration_id, message.is_extended_id, KIND_SWEEP,
+                                message.encode_raw_array({signal.name: raws}, len(raws), base_payload), index))
+        if "boundary" in modes:
+            raws = _boundary_raws(signal)
+            parts.append(_cases(message.arbitration_id, message.is_extended_id, KIND_BOUNDARY,
+                                message.encode_raw_array({signal.name: raws}, len(raws), base_payload), index))
+    if "random" in modes:
+        parts.append(_cases(message.arbitration_id, message.is_extended_id, KIND_RANDOM,
+                            rng.integers(0, 256, (random_count, message.definition.dlc), dtype=np.uint8)))
+    return parts
+
+
+def id_cases(arbitration_id, modes, rng, random_count=256):
+    # Cases for an ID with no signal definition: constant-byte boundary payloads and random payloads.
+    # A bare ID carries no frame format, so IDs above 0x7FF are sent extended and the rest standard.
+    is_extended_id = arbitration_id > 0x7FF
+    parts = []
+    if "boundary" in modes or "sweep" in modes:
+        payloads = np.repeat(np.array(BOUNDARY_BYTES, dtype=np.uint8)[:, None], 8, axis=1)
+        parts.append(_cases(arbitration_id, is_extended_id, KIND_BOUNDARY, payloads))
+    if "random" in modes:
+        parts.append(_cases(arbitration_id, is_extended_id, KIND_RANDOM, rng.integers(0, 256, (random_count, 8), dtype=np.uint8)))
+    return parts
+
+
+def build_cases(messages, ids=(), modes=KINDS, seed=0, sweep_step=1, random_count=256, shuffle=False,
+                max_sweep=MAX_SWEEP):
+    # One case table for the database messages and the extra IDs; the same arguments always give the same table
+    rng = np.random.default_rng(seed)
+    by_id = {message.arbitration_id: message for message in messages}
+    parts = []
+    for message in messages:
+        if message.definition.dlc <= 8:
+            base = message.encode(message.default_values())
+            parts.extend(message_cases(message, base, modes, rng, sweep_step, random_count, max_sweep))
+    for arbitration_id in ids:
+        if arbitration_id not in by_id:
+            parts.extend(id_cases(arbitration_id, modes, rng, random_count))
+    cases = np.concatenate(parts) if parts else np.zeros(0, dtype=CASE_DTYPE)
+    if shuffle:
+        cases = cases[rng.permutation(len(cases))]
+    return cases
+
+
+def pack_frames(cases):
+    # Preformatted struct can_frame rows for a raw CAN socket
+    frames = np.zeros(len(cases), dtype=CAN_FRAME_DTYPE)
+    ids = cases["arbitration_id"]
+    frames["can_id"] = np.where(cases["is_extended_id"], ids | CAN_EFF_FLAG, ids)
+    frames["dlc"] = cases["dlc"]
+    frames["data"] = cases["data"]
+    return frames
+
+
+def parse_ids(text):
+    # "0x18FF0000-0x18FF00FF,0x0CF00400" -> list of IDs
+    ids = []
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        first, _, last = item.partition("-")
+        ids.extend(range(int(first, 16), int(last or first, 16) + 1))
+    return ids
+
+
+class FuzzSender:
+    # Sends cases[start:stop] back to back; on SocketCAN through its own raw socket, elsewhere through python-can
+    # with one reused Message. sent_at[i] is the wall-clock time case i went out (NaN if it never did).
+    def __init__(self, channel, interface="socketcan", duty=1.0, period_s=1.0):
+        self.channel = channel
+        self.interface = interface
+        self.duty = duty
+        self.period_s = period_s
+        self.sent = 0
+        self.retries = 0
+        self._running = True
+        if interface == "socketcan":
+            self.sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+            self.sock.bind((channel,))
+            self.bus = None
+        else:
+            self.sock = None
+            self.bus = can.interface.Bus(channel=channel, interface=interface)
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        if self.bus is not None:
+            self.bus.shutdown()
+
+    def run(self, cases, sent_at, start=0, stop=None, progress=None):
+        stop = len(cases) if stop is None else stop
+        frames = pack_frames(cases) if self.sock is not None else None
+        view = memoryview(frames).cast("B") if frames is not None else None
+        message = can.Message(is_extended_id=True)
+        period_start = time.monotonic()
+        last_progress = period_start
+        index = start
+        while index < stop and self._running:
+            now = time.monotonic()
+            if self.duty < 1.0 and now - period_start >= self.duty * self.period_s:
+                # Off part of the duty cycle
+                time.sleep(max(0.0, period_start + self.period_s - now))
+                period_start = time.monotonic()
+                continue
+            if progress is not None and now - last_progress >= 1.0:
+                progress(index)
+                last_progress = now
+            try:
+                if view is not None:
+                    self.sock.send(view[index * CAN_FRAME_DTYPE.itemsize:(index + 1) * CAN_FRAME_DTYPE.itemsize])
+                else:
+                    case = cases[index]
+                    message.arbitration_id = int(case["arbitration_id"])
+                    message.is_extended_id = bool(case["is_extended_id"])
+                    message.dlc = int(case["dlc"])
+                    message.data = case["data"][:message.dlc].tobytes()
+                    self.bus.send(message)
+            except (OSError, can.CanError) as e:
+                if isinstance(e, OSError) and e.errno != errno.ENOBUFS:
+                    raise
+                # Transmit queue full: the bus is at its sustainable rate, wait for it to drain
+                self.retries += 1
+                time.sleep(0.0005)
+                continue
+            sent_at[index] = time.time()
+            self.sent += 1
+            index += 1
+        return index
+
+
+def save_run(path, cases, sent_at, seed, modes):
+    np.savez(path, cases=cases, sent_at=sent_at, seed=seed, modes=",".join(modes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz and sweep CAN payloads for ECU robustness tests")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="generate and send cases")
+    run.add_argument("--database", default=DEFAULT_DATABASE, help="message definitions (.json, .yaml or .dbc)")
+    run.add_argument("--no-database", action="store_true", help="only fuzz the --ids range")
+    run.add_argument("--ids", default="", help="extra hex IDs or ranges, e.g. 0x18FF0000-0x18FF00FF")
+    run.add_argument("--modes", default="sweep,boundary,random", help="comma separated: sweep, boundary, random")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--sweep-step", type=int, default=1, help="raw value step of the sweeps")
+    run.add_argument("--random", type=int, default=256, dest="random_count", help="random payloads per ID")
+    run.add_argument("--shuffle", action="store_true", help="send the cases in seeded random order")
+    run.add_argument("--duty", type=float, default=1.0, help="fraction of each period spent sending (0-1)")
+    run.add_argument("--period", type=float, default=1.0, help="duty cycle period in seconds")
+    run.add_argument("--log", default="fuzz_run.npz", help="case table and send times (.npz)")
+    replay = commands.add_parser("replay", help="send cases again from a saved run")
+    replay.add_argument("log", help=".npz written by a previous run")
+    replay.add_argument("cases", help="case index or range START:STOP")
+    for command in (run, replay):
+        command.add_argument("--interface", default="can0", help="CAN channel")
+        command.add_argument("--bustype", default="socketcan", help="python-can interface type")
+    args = parser.parse_args()
+    if args.command == "run" and not 0 < args.duty <= 1:
+        parser.error("--duty must be greater than 0 and at most 1")
+    if args.command == "run" and not 0 < args.period < float("inf"):
+        parser.error("--period must be a positive number of seconds")
+
+    if args.command == "replay":
+        with np.load(args.log) as saved:
+            cases = saved["cases"]
+        if "is_extended_id" not in cases.dtype.names:
+            # Logs written before the frame format was recorded sent every ID above 0x7FF extended
+            upgraded = np.zeros(len(cases), dtype=CASE_DTYPE)
+            for name in cases.dtype.names:
+                upgraded[name] = cases[name]
+            upgraded["is_extended_id"] = cases["arbitration_id"] > 0x7FF
+            cases = upgraded
+        first, _, last = args.cases.partition(":")
+        start, stop = int(first), int(last) if last else int(first) + 1
+        sender = FuzzSender(args.interface, args.bustype)
+        try:
+            sender.run(cases, np.full(len(cases), np.nan), start, stop)
+        finally:
+            sender.close()
+        for index in range(start, stop):
+            case = cases[index]
+            print(f"case {index}: {KINDS[case['kind']]} 0x{case['arbitration_id']:08X} {case['data'][:case['dlc']].tobytes().hex(' ')}")
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    messages = [] if args.no_database else load_database(args.database)
+    started = time.perf_counter()
+    cases = build_cases(messages, parse_ids(args.ids), modes, args.seed, args.sweep_step, args.random_count, args.shuffle)
+    print(f"Generated {len(cases)} cases in {(time.perf_counter() - started) * 1000:.0f} ms (seed {args.seed})")
+    sent_at = np.full(len(cases), np.nan)
+    sender = FuzzSender(args.interface, args.bustype, args.duty, args.period)
+    started = time.monotonic()
+    index = 0
+    try:
+        index = sender.run(cases, sent_at, progress=lambda index: print(f"case {index}/{len(cases)}", flush=True))
+    except KeyboardInterrupt:
+        index = int(np.count_nonzero(~np.isnan(sent_at)))
+    finally:
+        sender.close()
+        save_run(args.log, cases, sent_at, args.seed, modes)
+    elapsed = time.monotonic() - started
+    print(f"Sent {sender.sent} cases in {elapsed:.1f} s ({sender.sent / max(elapsed, 1e-9):.0f} frames/s, "
+          f"{sender.retries} ENOBUFS waits), stopped at case {index}; log in {args.log}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#Headless mode: runs only the transmit engine (no tkinter import, no X server needed).
+#Messages, initial values and cycle times come from a JSON config file and/or CLI flags; at runtime the
+#engine is controlled with line commands on stdin or with signals (SIGINT/SIGTERM quit, SIGUSR1 prints stats).
+#
+#Config file example:
+#    {"interface": "can0", "bustype": "socketcan", "bcm": false, "bitrate": 250000, "j1939_responder": true,
+#     "messages": {"Engine RPM": {"active": true, "cycle_time_ms": 20, "values": {"engine_speed": 1500}}}}
+
+import json
+import signal
+import sys
+import threading
+
+import can
+
+from bus_load import DEFAULT_BITRATE, format_load
+from signal_db import load_database, DEFAULT_DATABASE
+from tractor_controller import TractorController
+from tx_stats import format_stats
+
+HELP = """Commands:
+  start <message>                  start cyclic transmission
+  stop <message>                   stop cyclic transmission
+  set <message>.<signal>=<value>   change a signal value (takes effect on the next cycle)
+  cycle <message>=<ms>             change a cycle time (takes effect on the next frame)
+  record <path> | record stop      record sent/received frames to a binary trace
+  replay <path> [speed] | replay stop
+                                   replay a trace; started messages override their IDs
+  profile <path> | profile stop    run a drive-cycle profile (see profiles.py)
+  responder on | responder off     answer J1939 requests and address claims
+  list                             show messages, signals and current values
+  stats                            show per-message timing stats
+  quit                             stop everything and exit"""
+
+
+def load_config(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def build_controller(config, first_deadlines=None):
+    messages = load_database(config.get("database", DEFAULT_DATABASE))
+    controller = TractorController(messages, channel=config.get("interface", "can0"),
+                                   interface=config.get("bustype", "socketcan"), use_bcm=config.get("bcm", False),
+                                   bitrate=config.get("bitrate", DEFAULT_BITRATE), rx_filter=not config.get("rx_all", False))
+    apply_config(controller, config, first_deadlines)
+    if config.get("j1939_responder"):
+        try:
+            controller.start_responder()
+        except (OSError, can.CanError) as e:
+            print(f"J1939 responder not started, {controller.channel} could not be opened: {e}")
+    return controller
+
+
+def apply_config(controller, config, first_deadlines=None):
+    # Values and cycle times first so every message starts with its configured payload and period;
+    # first_deadlines ({name: monotonic time}) continues messages a session.ColdStart was sending
+    for name, settings in config.get("messages", {}).items():
+        if name not in controller.messages:
+            print(f"Unknown message in config: {name}")
+            continue
+        # A bad entry (e.g. hand-edited or from an older database) is skipped so the rest still starts
+        for signal_name, value in settings.get("values", {}).items():
+            try:
+                controller.set_value(name, signal_name, value)
+            except (KeyError, ValueError, TypeError, OverflowError) as e:
+                print(f"Skipped {name}.{signal_name}={value!r} from config: {e}")
+        if "cycle_time_ms" in settings:
+            try:
+                controller.set_cycle_time(name, settings["cycle_time_ms"])
+            except (ValueError, TypeError) as e:
+                print(f"Skipped {name} cycle time {settings['cycle_time_ms']!r} from config: {e}")
+    for name, settings in config.get("messages", {}).items():
+        if name in controller.messages and settings.get("active"):
+            try:
+                controller.start(name, (first_deadlines or {}).get(name))
+            except (OSError, can.CanError) as e:
+                # The bus is opened on the first start (e.g. can0 still coming up after a power cycle): come up
+                # idle so the messages can be started once the interface is there
+                print(f"Could not open {controller.channel}, messages not started: {e}")
+                break
+
+
+def parse_assignment(text):
+    # "Engine RPM.engine_speed=1500" -> ("Engine RPM", "engine_speed", "1500")
+    target, value = text.split("=", 1)
+    message_name, signal_name = target.rsplit(".", 1)
+    return message_name.strip(), signal_name.strip(), value.strip()
+
+
+def parse_id_list(text):
+    # "0CF004FE, 18FEF1FE" -> {0x0CF004FE, 0x18FEF1FE}
+    return {int(item, 16) for item in text.replace(",", " ").split()}
+
+
+def handle_command(controller, line):
+    # Returns False when the command asks to quit
+    command, _, argument = line.strip().partition(" ")
+    argument = argument.strip()
+    try:
+        if command == "start":
+            controller.start(argument)
+        elif command == "stop":
+            controller.stop(argument)
+        elif command == "set":
+            controller.set_value(*parse_assignment(argument))
+        elif command == "cycle":
+            message_name, cycle_time_ms = argument.rsplit("=", 1)
+            controller.set_cycle_time(message_name.strip(), cycle_time_ms)
+        elif command == "record":
+            if argument == "stop":
+                controller.stop_recording()
+            else:
+                controller.start_recording(argument)
+        elif command == "replay":
+            if argument == "stop":
+                controller.stop_replay()
+            else:
+                path, _, speed = argument.rpartition(" ")
+                if not path or not speed.replace(".", "", 1).isdigit():
+                    path, speed = argument, "1"
+                controller.start_replay(path, float(speed))
+        elif command == "profile":
+            if argument == "stop":
+                controller.stop_profile()
+            else:
+                controller.start_profile(argument)
+        elif command == "responder":
+            if argument == "off":
+                controller.stop_responder()
+            else:
+                controller.start_responder()
+        elif command == "list":
+            for name, values in controller.values.items():
+                state = "Sending" if controller.is_active(name) else "Idle"
+                print(f"{name} [{state}, {controller.cycle_times_ms[name]} ms]: {values}")
+        elif command == "stats":
+            print_stats(controller)
+        elif command in ("quit", "exit"):
+            return False
+        elif command:
+            print(HELP)
+    except KeyError as e:
+        print(f"Unknown message or signal: {e}")
+    except OSError as e:
+        print(f"File error: {e}")
+    except ValueError as e:
+        print(f"Invalid command {line.strip()!r}: {e}")
+    sys.stdout.flush()
+    return True
+
+
+def print_stats(controller):
+    for name, stats in controller.stats_snapshot().items():
+        print(f"{name}: " + ("kernel BCM" if stats is None else format_stats(stats).replace("\n", "  ")))
+    print(f"Expected bus load: {format_load(controller.bus_load(), controller.bitrate)}")
+    sys.stdout.flush()
+
+
+def run_headless(controller, session=None):
+    stop_event = threading.Event()
+
+    def read_commands():
+        for line in sys.stdin:
+            if not handle_command(controller, line):
+                break
+        else:
+            # stdin closed (e.g. started as a daemon): keep transmitting until a signal arrives
+            return
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGUSR1, lambda signum, frame: print_stats(controller))
+
+    print("Headless mode running. Type 'help' for commands.")
+    sys.stdout.flush()
+    threading.Thread(target=read_commands, name="stdin-commands", daemon=True).start()
+    while not stop_event.wait(0.5):
+        if session is not None:
+            session.update()
+    if session is not None:
+        session.update()
+    controller.shutdown()
+    print("Headless mode stopped.")
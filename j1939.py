@@ -0,0 +1,313 @@
+#J1939 network management for the emulated ECUs: answers Request PGN (0xEA00) messages with the current
+#pre-encoded payload of the requested PGN and takes part in address claiming (0xEE00) for every source address
+#the message database transmits from. It is a can.Listener on the controller's Notifier, so a request is
+#answered from the receive thread as soon as it arrives, without waiting for the GUI or the transmit schedule.
+#
+#Payloads longer than 8 bytes use the transport protocol (TP.CM 0xEC00 / TP.DT 0xEB00). A Transfer cuts the
+#payload into 7 byte memoryview segments and builds each packet only when it is sent: broadcast (BAM)
+#transfers are paced by the TxScheduler heap at BAM_GAP_S between packets, connection mode (RTS/CTS) transfers
+#to a requester are driven by the CTS and EOM acknowledgements seen here. Incoming BAM and RTS sessions are
+#reassembled into one preallocated buffer each (at most TP_MAX_SIZE bytes, MAX_SESSIONS at a time) and handed
+#to the receive monitor when complete.
+
+import time
+
+import can
+
+PGN_REQUEST = 0xEA00
+PGN_ADDRESS_CLAIM = 0xEE00
+PGN_ACKNOWLEDGEMENT = 0xE800
+PGN_TP_CM = 0xEC00
+PGN_TP_DT = 0xEB00
+
+ADDRESS_GLOBAL = 0xFF
+ADDRESS_NULL = 0xFE
+
+ACK_NEGATIVE = 1
+
+TP_RTS = 16
+TP_CTS = 17
+TP_EOM_ACK = 19
+TP_BAM = 32
+TP_ABORT = 255
+ABORT_RESOURCES = 2
+ABORT_TIMEOUT = 3
+
+TP_PRIORITY = 7
+TP_MAX_SIZE = 1785
+# BAM packets must be 50-200 ms apart
+BAM_GAP_S = 0.05
+# Receiver timeout between packets (T1) and sender timeout waiting for CTS/EOM (T3)
+TP_T1_S = 0.75
+TP_T3_S = 1.25
+MAX_SESSIONS = 16
+# Packets requested per CTS when receiving in connection mode
+CTS_PACKETS = 16
+
+# Arbitrary address capable, industry group 2 (agricultural); the source address goes in the identity number
+DEFAULT_NAME = 0xA000000000000000
+
+
+def parse_id(arbitration_id):
+    # (priority, pgn, destination address or None for PDU2, source address)
+    priority = arbitration_id >> 26 & 0x7
+    pdu_format = arbitration_id >> 16 & 0xFF
+    pgn = arbitration_id >> 8 & 0x3FFFF
+    if pdu_format < 240:
+        return priority, pgn & 0x3FF00, pgn & 0xFF, arbitration_id & 0xFF
+    return priority, pgn, None, arbitration_id & 0xFF
+
+
+def build_id(priority, pgn, source_address, destination_address=ADDRESS_GLOBAL):
+    if pgn >> 8 & 0xFF < 240:
+        pgn = pgn & 0x3FF00 | destination_address
+    return priority << 26 | pgn << 8 | source_address
+
+
+def cm_payload(control, size, packets, pgn, extra=0xFF):
+    return bytes((control,)) + size.to_bytes(2, "little") + bytes((packets, extra)) + pgn.to_bytes(3, "little")
+
+
+class Transfer:
+    # Sender side of one transport protocol message: frame(0) is the TP.CM (BAM or RTS), frame(n) the n-th TP.DT
+    def __init__(self, message, destination_address=ADDRESS_GLOBAL, entry=None):
+        _, self.pgn, _, self.source_address = parse_id(message.arbitration_id)
+        self.destination_address = destination_address
+        self.size = len(message.data)
+        view = memoryview(bytes(message.data))
+        self.segments = [view[offset:offset + 7] for offset in range(0, self.size, 7)]
+        self.count = len(self.segments) + 1
+        # Scheduler state: next frame index to send; entry is the cyclic TxEntry this transfer carries
+        self.next_index = 0
+        self.entry = entry
+        self.gap_s = BAM_GAP_S
+        self.deadline = None
+        self._cm_id = build_id(TP_PRIORITY, PGN_TP_CM, self.source_address, destination_address)
+        self._dt_id = build_id(TP_PRIORITY, PGN_TP_DT, self.source_address, destination_address)
+
+    @property
+    def is_broadcast(self):
+        return self.destination_address == ADDRESS_GLOBAL
+
+    @property
+    def finished(self):
+        return self.next_index >= self.count
+
+    def frame(self, index):
+        if index == 0:
+            data = cm_payload(TP_BAM if self.is_broadcast else TP_RTS, self.size, len(self.segments), self.pgn)
+            return can.Message(arbitration_id=self._cm_id, data=data, is_extended_id=True)
+        segment = self.segments[index - 1]
+        data = bytes((index,)) + segment + b"\xff" * (7 - len(segment))
+        return can.Message(arbitration_id=self._dt_id, data=data, is_extended_id=True)
+
+
+class ReceiveSession:
+    # One incoming BAM or RTS/CTS message, reassembled in place
+    def __init__(self, pgn, size, packets, source_address, destination_address, max_per_cts):
+        self.pgn = pgn
+        self.size = size
+        self.packets = packets
+        self.source_address = source_address
+        self.destination_address = destination_address
+        self.data = bytearray(size)
+        self.next_sequence = 1
+        self.window_end = min(packets, max_per_cts)
+        self.deadline = time.monotonic() + TP_T1_S
+
+
+class J1939Responder(can.Listener):
+    def __init__(self, controller, name=DEFAULT_NAME):
+        self.controller = controller
+        self.bus = controller.get_tx_scheduler().bus
+        # pgn -> [(source address, message name)] for every extended message in the database
+        self.by_pgn = {}
+        for message_name, message in controller.messages.items():
+            if message.is_extended_id:
+                _, pgn, _, source_address = parse_id(message.arbitration_id)
+                self.by_pgn.setdefault(pgn, []).append((source_address, message_name))
+        self.addresses = {source_address for entries in self.by_pgn.values() for source_address, _ in entries} - {ADDRESS_NULL, ADDRESS_GLOBAL}
+        self.names = {source_address: name | source_address for source_address in self.addresses}
+        # Addresses claimed by another ECU; kept apart so the null-address entries of by_pgn still answer
+        self.lost_addresses = set()
+        self.answered = 0
+        self.rejected = 0
+        # Transport sessions keyed by (source address, destination address)
+        self.receiving = {}
+        self.sending = {}
+        self.reassembled = 0
+        self.aborted = 0
+        for source_address in sorted(self.addresses):
+            self._send_claim(source_address)
+
+    def rx_filters(self):
+        # Kernel filters for the PGNs handled here, whatever their destination and source
+        return [{"can_id": pgn << 8, "can_mask": 0x03FF0000, "extended": True}
+                for pgn in (PGN_REQUEST, PGN_ADDRESS_CLAIM, PGN_TP_CM, PGN_TP_DT)]
+
+    def on_message_received(self, msg):
+        if not msg.is_extended_id or msg.is_error_frame or msg.is_remote_frame:
+            return
+        _, pgn, destination_address, source_address = parse_id(msg.arbitration_id)
+        if pgn == PGN_REQUEST and len(msg.data) >= 3:
+            self._handle_request(msg.data[0] | msg.data[1] << 8 | msg.data[2] << 16, destination_address, source_address)
+        elif pgn == PGN_ADDRESS_CLAIM and source_address in self.addresses and len(msg.data) >= 8:
+            self._handle_claim(source_address, int.from_bytes(msg.data[:8], "little"))
+        elif pgn == PGN_TP_CM and len(msg.data) >= 8:
+            self._handle_tp_cm(msg.data, destination_address, source_address)
+        elif pgn == PGN_TP_DT and len(msg.data) >= 2:
+            self._handle_tp_dt(msg.timestamp, msg.data, destination_address, source_address)
+
+    def _handle_request(self, requested_pgn, destination_address, requester):
+        if destination_address != ADDRESS_GLOBAL and destination_address not in self.addresses:
+            return
+        if requested_pgn == PGN_ADDRESS_CLAIM:
+            for source_address in sorted(self.addresses):
+                if destination_address in (ADDRESS_GLOBAL, source_address):
+                    self._send_claim(source_address)
+            return
+        answered = False
+        for source_address, message_name in self.by_pgn.get(requested_pgn, ()):
+            if source_address in self.lost_addresses or destination_address not in (ADDRESS_GLOBAL, source_address):
+                continue
+            current = self.controller.current_message(message_name)
+            priority = current.arbitration_id >> 26 & 0x7
+            response = can.Message(arbitration_id=build_id(priority, requested_pgn, source_address, requester),
+                                   data=current.data, is_extended_id=True)
+            if len(current.data) <= 8:
+                self._send(response.arbitration_id, response.data)
+            elif destination_address == ADDRESS_GLOBAL:
+                self.controller.get_tx_scheduler().send_transfer(Transfer(response))
+            else:
+                self._start_connection(Transfer(response, requester))
+            answered = True
+        if answered:
+            self.answered += 1
+        elif destination_address != ADDRESS_GLOBAL:
+            # Destination-specific requests for PGNs we do not emulate get a NACK; global ones stay unanswered
+            self.rejected += 1
+            self._send(build_id(6, PGN_ACKNOWLEDGEMENT, destination_address),
+                       bytes((ACK_NEGATIVE, 0xFF, 0xFF, 0xFF, requester)) + requested_pgn.to_bytes(3, "little"))
+
+    def _handle_claim(self, source_address, name):
+        # Lowest NAME wins the address; on a loss the emulated ECU stops answering for it
+        own_name = self.names[source_address]
+        if name == own_name:
+            return
+        if name < own_name:
+            self.addresses.discard(source_address)
+            self.lost_addresses.add(source_address)
+            print(f"J1939 address 0x{source_address:02X} claimed by NAME 0x{name:016X}, no longer answering for it")
+        else:
+            self._send_claim(source_address)
+
+    def _start_connection(self, transfer):
+        # One connection per address pair; a new request replaces a transfer that is still waiting for CTS
+        key = (transfer.source_address, transfer.destination_address)
+        transfer.deadline = time.monotonic() + TP_T3_S
+        self.sending[key] = transfer
+        self._send_frame(transfer.frame(0))
+
+    def _handle_tp_cm(self, data, destination_address, source_address):
+        control = data[0]
+        size = data[1] | data[2] << 8
+        pgn = data[5] | data[6] << 8 | data[7] << 16
+        self._expire_sessions()
+        if control == TP_BAM and destination_address == ADDRESS_GLOBAL:
+            key = (source_address, ADDRESS_GLOBAL)
+            if size <= TP_MAX_SIZE and (key in self.receiving or len(self.receiving) < MAX_SESSIONS):
+                self.receiving[key] = ReceiveSession(pgn, size, data[3], source_address, ADDRESS_GLOBAL, data[3])
+        elif control == TP_RTS and destination_address in self.addresses:
+            key = (source_address, destination_address)
+            if size > TP_MAX_SIZE or (key not in self.receiving and len(self.receiving) >= MAX_SESSIONS):
+                self._send_abort(destination_address, source_address, pgn, ABORT_RESOURCES)
+                return
+            session = ReceiveSession(pgn, size, data[3], source_address, destination_address, min(data[4], CTS_PACKETS))
+            self.receiving[key] = session
+            self._send_cts(session)
+        elif control == TP_CTS:
+            transfer = self.sending.get((destination_address, source_address))
+            if transfer is None:
+                return
+            # CTS with zero packets means "wait"; otherwise send the requested window right away
+            transfer.deadline = time.monotonic() + TP_T3_S
+            first = data[2] or 1
+            for index in range(first, min(first + data[1], transfer.count)):
+                self._send_frame(transfer.frame(index))
+        elif control == TP_EOM_ACK:
+            self.sending.pop((destination_address, source_address), None)
+        elif control == TP_ABORT:
+            self.sending.pop((destination_address, source_address), None)
+            self.receiving.pop((source_address, destination_address), None)
+
+    def _handle_tp_dt(self, timestamp, data, destination_address, source_address):
+        key = (source_address, destination_address)
+        session = self.receiving.get(key)
+        if session is None:
+            return
+        sequence = data[0]
+        if sequence != session.next_sequence:
+            # A lost or repeated packet breaks the message; connection mode tells the sender
+            del self.receiving[key]
+            self.aborted += 1
+            if destination_address != ADDRESS_GLOBAL:
+                self._send_abort(destination_address, source_address, session.pgn, ABORT_TIMEOUT)
+            return
+        offset = (sequence - 1) * 7
+        session.data[offset:offset + 7] = data[1:1 + min(7, session.size - offset)]
+        session.next_sequence += 1
+        session.deadline = time.monotonic() + TP_T1_S
+        if sequence >= session.packets:
+            del self.receiving[key]
+            self.reassembled += 1
+            if destination_address != ADDRESS_GLOBAL:
+                self._send_frame(can.Message(arbitration_id=build_id(TP_PRIORITY, PGN_TP_CM, destination_address, source_address),
+                                             data=cm_payload(TP_EOM_ACK, session.size, session.packets, session.pgn),
+                                             is_extended_id=True))
+            monitor = self.controller.rx_monitor
+            if monitor is not None:
+                monitor.on_transport_message(timestamp, build_id(TP_PRIORITY, session.pgn, source_address, destination_address),
+                                             bytes(session.data))
+        elif destination_address != ADDRESS_GLOBAL and sequence >= session.window_end:
+            session.window_end = min(session.packets, sequence + CTS_PACKETS)
+            self._send_cts(session)
+
+    def _send_cts(self, session):
+        count = session.window_end - session.next_sequence + 1
+        data = bytes((TP_CTS, count, session.next_sequence, 0xFF, 0xFF)) + session.pgn.to_bytes(3, "little")
+        self._send_frame(can.Message(arbitration_id=build_id(TP_PRIORITY, PGN_TP_CM, session.destination_address, session.source_address),
+                                     data=data, is_extended_id=True))
+
+    def _send_abort(self, source_address, destination_address, pgn, reason):
+        data = bytes((TP_ABORT, reason, 0xFF, 0xFF, 0xFF)) + pgn.to_bytes(3, "little")
+        self._send_frame(can.Message(arbitration_id=build_id(TP_PRIORITY, PGN_TP_CM, source_address, destination_address),
+                                     data=data, is_extended_id=True))
+
+    def _expire_sessions(self):
+        # Checked whenever a TP.CM arrives, so stale sessions never hold a slot for long
+        now = time.monotonic()
+        for key, session in list(self.receiving.items()):
+            if now > session.deadline:
+                del self.receiving[key]
+                self.aborted += 1
+                if session.destination_address != ADDRESS_GLOBAL:
+                    self._send_abort(session.destination_address, session.source_address, session.pgn, ABORT_TIMEOUT)
+        for key, transfer in list(self.sending.items()):
+            if now > transfer.deadline:
+                del self.sending[key]
+                self.aborted += 1
+
+    def _send_claim(self, source_address):
+        self._send(build_id(6, PGN_ADDRESS_CLAIM, source_address), self.names[source_address].to_bytes(8, "little"))
+
+    def _send(self, arbitration_id, data):
+        self._send_frame(can.Message(arbitration_id=arbitration_id, data=data, is_extended_id=True))
+
+    def _send_frame(self, msg):
+        try:
+            self.bus.send(msg)
+        except can.CanError:
+            print(f"Failed to send J1939 response 0x{msg.arbitration_id:08X}")
+            return
+        if self.controller.recorder is not None:
+            self.controller.recorder.record_message(msg, is_rx=False)
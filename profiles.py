@@ -0,0 +1,91 @@
+#Drive-cycle profiles: each signal follows a ramp, step, sine, piecewise-linear or CSV time series.
+#A profile is sampled with numpy at each message's cycle time and encoded into a buffer of payloads when it
+#is loaded, so on every tick the scheduler only picks the next precomputed frame.
+#
+#Profile file example (signals that are not listed keep their current value):
+#    {"duration_s": 600, "loop": false,
+#     "messages": {
+#       "Engine RPM": {"engine_speed": {"type": "ramp", "start": 800, "end": 2200}},
+#       "Tractor Guidance": {"curvature": {"type": "sine", "amplitude": 0.05, "period_s": 20}},
+#       "Set Speed MPH": {"f1": {"type": "step", "values": [5, 10, 15], "step_s": 60}},
+#       "Tractor Speed": {"wheel_based_speed": {"type": "piecewise", "points": [[0, 0], [30, 8], [600, 8]]}},
+#       "Hand Throttle %": {"throttle": {"type": "csv", "path": "throttle.csv", "column": "throttle", "time_column": "t"}}}}
+
+import csv
+import json
+import os
+
+import numpy as np
+
+
+def _load_csv_series(spec, base_dir):
+    path = spec["path"] if os.path.isabs(spec["path"]) else os.path.join(base_dir, spec["path"])
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    values = np.array([float(row[spec["column"]]) for row in rows])
+    if "time_column" in spec:
+        times = np.array([float(row[spec["time_column"]]) for row in rows])
+    else:
+        times = np.arange(len(values)) * spec.get("sample_s", 1.0)
+    return times, values
+
+
+def sample_signal(spec, times, base_dir="."):
+    # Returns the physical value of one signal at every time in `times` (seconds from profile start)
+    kind = spec["type"]
+    if kind == "constant":
+        return np.full(len(times), spec["value"], dtype=np.float64)
+    if kind == "ramp":
+        start_s = spec.get("start_s", 0.0)
+        duration_s = spec.get("duration_s", times[-1] - start_s if len(times) else 1.0) or 1.0
+        fraction = np.clip((times - start_s) / duration_s, 0.0, 1.0)
+        return spec["start"] + (spec["end"] - spec["start"]) * fraction
+    if kind == "step":
+        values = np.array(spec["values"], dtype=object if isinstance(spec["values"][0], str) else np.float64)
+        if "times" in spec:
+            index = np.searchsorted(np.asarray(spec["times"], dtype=np.float64), times, side="right") - 1
+        else:
+            index = (times // spec["step_s"]).astype(np.int64)
+        return values[np.clip(index, 0, len(values) - 1)]
+    if kind == "sine":
+        phase = spec.get("phase_deg", 0.0) * np.pi / 180
+        return spec.get("offset", 0.0) + spec["amplitude"] * np.sin(2 * np.pi * times / spec["period_s"] + phase)
+    if kind == "piecewise":
+        points = np.asarray(spec["points"], dtype=np.float64)
+        return np.interp(times, points[:, 0], points[:, 1])
+    if kind == "csv":
+        series_times, series_values = _load_csv_series(spec, base_dir)
+        return np.interp(times, series_times, series_values)
+    raise ValueError(f"Unknown profile type {kind!r}")
+
+
+def build_profile_frames(message, signal_specs, current_values, cycle_time_ms, duration_s, base_dir="."):
+    # Samples every profiled signal at the message cycle time and encodes the whole run into payload bytes
+    count = max(1, int(round(duration_s * 1000 / cycle_time_ms)))
+    times = np.arange(count) * (cycle_time_ms / 1000)
+    values = dict(current_values)
+    for signal_name, spec in signal_specs.items():
+        signal = message.signals[signal_name]
+        samples = sample_signal(spec, times, base_dir)
+        if not signal.choices:
+            if signal.minimum is not None and samples.min() < signal.minimum:
+                raise ValueError(f"{message.name}.{signal_name} profile goes below {signal.minimum}")
+            if signal.maximum is not None and samples.max() > signal.maximum:
+                raise ValueError(f"{message.name}.{signal_name} profile goes above {signal.maximum}")
+        values[signal_name] = samples
+    payloads = message.encode_array(values, count)
+    return [row.tobytes() for row in payloads]
+
+
+def load_profile(path, controller):
+    # Returns ({message name: [payload bytes per cycle]}, loop) using the controller's values and cycle times
+    with open(path) as f:
+        content = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    frames = {}
+    for message_name, signal_specs in content["messages"].items():
+        frames[message_name] = build_profile_frames(controller.messages[message_name], signal_specs,
+                                                    controller.values[message_name],
+                                                    controller.cycle_times_ms[message_name],
+                                                    content["duration_s"], base_dir)
+    return frames, content.get("loop", False)
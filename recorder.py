@@ -0,0 +1,150 @@
+#Binary recording of transmitted and received frames.
+#The send/receive paths only pack a fixed-size record and put it on a bounded queue (never blocking; a full
+#queue is counted as dropped). A background writer thread drains the queue in batches, writes with one
+#write() call per batch and rotates files by size or age. Files are a 16 byte header followed by 24 byte
+#records, so they can be memory-mapped with numpy (read_recording) or exported to BLF/ASC with python-can.
+#
+#    python recorder.py export trace.tcr trace.blf
+
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+import can
+
+FILE_MAGIC = b"TCANREC1"
+HEADER = struct.Struct("<8s8x")
+RECORD = struct.Struct("<dIBB2x8s")
+
+FLAG_EXTENDED = 0x01
+FLAG_RX = 0x02
+
+
+def record_dtype():
+    import numpy as np
+    return np.dtype([("timestamp", "<f8"), ("arbitration_id", "<u4"), ("flags", "u1"), ("dlc", "u1"),
+                     ("pad", "u1", 2), ("data", "u1", 8)])
+
+
+class Recorder:
+    def __init__(self, path, max_bytes=None, max_seconds=None, queue_size=1 << 16, batch_size=4096):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.batch_size = batch_size
+        self.recorded = 0
+        self.dropped = 0
+        self.files = []
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._file_index = 0
+        self._thread = threading.Thread(target=self._run, name="can-recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, timestamp, arbitration_id, data, is_extended_id=True, is_rx=False):
+        # Called from the transmit/receive threads: pack and enqueue, never wait on the writer
+        flags = (FLAG_EXTENDED if is_extended_id else 0) | (FLAG_RX if is_rx else 0)
+        try:
+            self._queue.put_nowait(RECORD.pack(timestamp, arbitration_id, flags, len(data), bytes(data)))
+        except queue.Full:
+            self.dropped += 1
+
+    def record_message(self, msg, is_rx):
+        self.record(msg.timestamp if is_rx else time.time(), msg.arbitration_id, msg.data[:8], msg.is_extended_id, is_rx)
+
+    def close(self):
+        # The None sentinel wakes the writer at once; everything queued before it is still written
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_path(self):
+        if self.max_bytes is None and self.max_seconds is None:
+            return self.path
+        stem, extension = os.path.splitext(self.path)
+        return f"{stem}_{self._file_index:04d}{extension}"
+
+    def _open(self):
+        path = self._next_path()
+        self._file_index += 1
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(FILE_MAGIC))
+        self._opened_at = time.monotonic()
+        self._written = HEADER.size
+        self.files.append(path)
+
+    def _rotate_if_needed(self):
+        if self.max_bytes is not None and self._written >= self.max_bytes:
+            self._file.close()
+            self._open()
+        elif self.max_seconds is not None and time.monotonic() - self._opened_at >= self.max_seconds:
+            self._file.close()
+            self._open()
+
+    def _run(self):
+        self._open()
+        while True:
+            try:
+                record = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                self._rotate_if_needed()
+                continue
+            batch = []
+            while record is not None:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                chunk = b"".join(batch)
+                self._file.write(chunk)
+                self._written += len(chunk)
+                self.recorded += len(batch)
+                self._rotate_if_needed()
+            if record is None:
+                break
+        self._file.close()
+
+
+def read_recording(path):
+    # Memory-mapped structured array of every record in the file (nothing is loaded up front)
+    import numpy as np
+    with open(path, "rb") as f:
+        magic, = HEADER.unpack(f.read(HEADER.size))
+    if magic != FILE_MAGIC:
+        raise ValueError(f"{path} is not a Tractor CAN recording")
+    dtype = record_dtype()
+    count = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=HEADER.size, shape=(count,))
+
+
+def export_recording(path, out_path, channel="can0"):
+    # Output format follows the extension (.blf, .asc, .log, .csv ...) via python-can's Logger
+    records = read_recording(path)
+    with can.Logger(out_path) as writer:
+        for record in records:
+            dlc = int(record["dlc"])
+            writer.on_message_received(can.Message(
+                timestamp=float(record["timestamp"]),
+                arbitration_id=int(record["arbitration_id"]),
+                is_extended_id=bool(record["flags"] & FLAG_EXTENDED),
+                is_rx=bool(record["flags"] & FLAG_RX),
+                dlc=dlc,
+                data=record["data"][:dlc].tobytes(),
+                channel=channel,
+            ))
+    return len(records)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "export":
+        print("usage: python recorder.py export <recording> <output.blf|.asc|.log>")
+        sys.exit(1)
+    print(f"Exported {export_recording(sys.argv[2], sys.argv[3])} frames to {sys.argv[3]}")
@@ -0,0 +1,140 @@
+#Replays recorded traces onto the bus the transmit engine already owns.
+#Recordings from recorder.py are memory-mapped and walked in chunks (filters are applied with numpy per chunk),
+#candump .log files are memory-mapped and parsed line by line, and ASC/BLF/TRC files are streamed with
+#python-can's LogReader, so a multi-gigabyte trace is never loaded into Python objects at once.
+#Frames are sent on absolute deadlines (first timestamp + offset / speed). IDs in override_ids (the messages
+#currently started from the GUI/controller) are dropped from the log so the live values win.
+
+import mmap
+import os
+import threading
+import time
+
+import can
+
+CHUNK_RECORDS = 4096
+
+
+def j1939_key(arbitration_id, is_extended_id=True):
+    # Extended IDs match on priority-less PGN so a log from another source address still matches
+    return arbitration_id & 0x03FFFF00 if is_extended_id else arbitration_id
+
+
+def _iter_recording(path, include_ids, exclude_ids):
+    import numpy as np
+    from recorder import read_recording, FLAG_EXTENDED
+    records = read_recording(path)
+    include = np.array(sorted(include_ids), dtype=np.uint32) if include_ids else None
+    exclude = np.array(sorted(exclude_ids), dtype=np.uint32) if exclude_ids else None
+    for start in range(0, len(records), CHUNK_RECORDS):
+        chunk = records[start:start + CHUNK_RECORDS]
+        mask = np.ones(len(chunk), dtype=bool)
+        if include is not None:
+            mask &= np.isin(chunk["arbitration_id"], include)
+        if exclude is not None:
+            mask &= ~np.isin(chunk["arbitration_id"], exclude)
+        chunk = chunk[mask]
+        timestamps = chunk["timestamp"].tolist()
+        ids = chunk["arbitration_id"].tolist()
+        extended = (chunk["flags"] & FLAG_EXTENDED).astype(bool).tolist()
+        dlcs = chunk["dlc"].tolist()
+        data = chunk["data"]
+        for i in range(len(chunk)):
+            yield timestamps[i], ids[i], extended[i], data[i, :dlcs[i]].tobytes()
+
+
+def _iter_candump(path, include_ids, exclude_ids):
+    # candump -l format: "(1436509052.249713) can0 0CF004FE#0000000000000000"
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for line in iter(mm.readline, b""):
+            parts = line.split()
+            if len(parts) < 3 or b"#" not in parts[2]:
+                continue
+            can_id, _, payload = parts[2].partition(b"#")
+            if payload.startswith(b"R"):
+                continue
+            arbitration_id = int(can_id, 16)
+            if include_ids and arbitration_id not in include_ids:
+                continue
+            if exclude_ids and arbitration_id in exclude_ids:
+                continue
+            yield float(parts[0].strip(b"()")), arbitration_id, len(can_id) > 3, bytes.fromhex(payload.decode())
+
+
+def _iter_log_reader(path, include_ids, exclude_ids):
+    for msg in can.LogReader(path):
+        if msg.is_error_frame or msg.is_remote_frame:
+            continue
+        if include_ids and msg.arbitration_id not in include_ids:
+            continue
+        if exclude_ids and msg.arbitration_id in exclude_ids:
+            continue
+        yield msg.timestamp, msg.arbitration_id, msg.is_extended_id, bytes(msg.data)
+
+
+def iter_trace(path, include_ids=None, exclude_ids=None):
+    # Yields (timestamp, arbitration_id, is_extended_id, data) in file order
+    from recorder import FILE_MAGIC
+    with open(path, "rb") as f:
+        if f.read(len(FILE_MAGIC)) == FILE_MAGIC:
+            return _iter_recording(path, include_ids, exclude_ids)
+    if os.path.splitext(path)[1].lower() == ".log":
+        return _iter_candump(path, include_ids, exclude_ids)
+    return _iter_log_reader(path, include_ids, exclude_ids)
+
+
+class LogReplay:
+    def __init__(self, bus, path, speed=1.0, include_ids=None, exclude_ids=None):
+        self.bus = bus
+        self.path = path
+        self.speed = speed
+        self.include_ids = set(include_ids or ())
+        self.exclude_ids = set(exclude_ids or ())
+        # J1939 keys (see j1939_key) of frames that come from live values instead of the log
+        self.override_ids = frozenset()
+        # Optional recorder.Recorder, set by the controller while recording
+        self.recorder = None
+        self.sent = 0
+        self.skipped = 0
+        self.errors = 0
+        self.finished = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="can-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        message = can.Message(is_extended_id=True)
+        start = None
+        first_timestamp = None
+        try:
+            for timestamp, arbitration_id, is_extended_id, data in iter_trace(self.path, self.include_ids, self.exclude_ids):
+                if self._stop.is_set():
+                    break
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                    start = time.monotonic()
+                if j1939_key(arbitration_id, is_extended_id) in self.override_ids:
+                    self.skipped += 1
+                    continue
+                deadline = start + (timestamp - first_timestamp) / self.speed
+                delay = deadline - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                message.arbitration_id = arbitration_id
+                message.is_extended_id = is_extended_id
+                message.dlc = len(data)
+                message.data = data
+                try:
+                    self.bus.send(message)
+                    self.sent += 1
+                    if self.recorder is not None:
+                        self.recorder.record(time.time(), arbitration_id, data, is_extended_id)
+                except can.CanError:
+                    self.errors += 1
+        finally:
+            self.finished = True
+            print(f"Replay of {self.path} finished: {self.sent} sent, {self.skipped} overridden, {self.errors} errors")
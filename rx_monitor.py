@@ -0,0 +1,117 @@
+#Receive side of the tool: a can.Notifier on the same bus the TxScheduler sends on writes every incoming frame
+#into a preallocated NumPy ring buffer (timestamp, ID, DLC, payload). Nothing is decoded per frame; the GUI
+#calls poll() from a single root.after tick and only the newest frame of each ID is decoded for the table.
+
+import threading
+
+import can
+import numpy as np
+
+
+class RxRingBuffer:
+    def __init__(self, capacity=1 << 16):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.ids = np.zeros(capacity, dtype=np.uint32)
+        self.dlcs = np.zeros(capacity, dtype=np.uint8)
+        self.data = np.zeros((capacity, 8), dtype=np.uint8)
+        # Total frames ever written; single writer (the Notifier thread), readers only compare against it
+        self.count = 0
+
+    def append(self, timestamp, arbitration_id, data):
+        index = self.count % self.capacity
+        dlc = min(len(data), 8)
+        self.timestamps[index] = timestamp
+        self.ids[index] = arbitration_id
+        self.dlcs[index] = dlc
+        self.data[index, :dlc] = np.frombuffer(data, dtype=np.uint8, count=dlc)
+        self.data[index, dlc:] = 0
+        self.count += 1
+
+    def read_since(self, start):
+        # Returns (index array in write order, new position, frames lost to overrun)
+        end = self.count
+        lost = max(0, end - start - self.capacity)
+        start += lost
+        return np.arange(start, end) % self.capacity, end, lost
+
+
+class RxMonitor(can.Listener):
+    def __init__(self, notifier, messages, capacity=1 << 16):
+        self.ring = RxRingBuffer(capacity)
+        self.by_id = {message.arbitration_id: message for message in messages}
+        # J1939: same PGN from a different source address still decodes
+        self.by_pgn = {message.arbitration_id & 0x03FFFF00: message for message in messages if message.is_extended_id}
+        self.position = 0
+        self.lost = 0
+        # arbitration_id -> [count, first timestamp, last timestamp, last payload bytes]
+        self.latest = {}
+        # Optional recorder.Recorder fed from the Notifier thread
+        self.recorder = None
+        # poll() may be called from the GUI tick and the control server
+        self._poll_lock = threading.Lock()
+        # The controller's Notifier is shared with the J1939 responder, so the monitor only adds itself to it
+        self.notifier = notifier
+        notifier.add_listener(self)
+
+    def on_message_received(self, msg):
+        if msg.is_error_frame or msg.is_remote_frame:
+            return
+        self.ring.append(msg.timestamp, msg.arbitration_id, msg.data)
+        if self.recorder is not None:
+            self.recorder.record_message(msg, is_rx=True)
+
+    def on_transport_message(self, timestamp, arbitration_id, data):
+        # Reassembled J1939 transport messages (rare) go straight into the table under their PGN and source address
+        with self._poll_lock:
+            row = self.latest.get(arbitration_id)
+            if row is None:
+                self.latest[arbitration_id] = [1, timestamp, timestamp, data]
+            else:
+                row[0] += 1
+                row[2] = timestamp
+                row[3] = data
+
+    def close(self):
+        self.notifier.remove_listener(self)
+
+    def lookup(self, arbitration_id):
+        message = self.by_id.get(arbitration_id)
+        if message is None:
+            message = self.by_pgn.get(arbitration_id & 0x03FFFF00)
+        return message
+
+    def poll(self):
+        # Fold everything received since the last tick into the per-ID table in one vectorised pass
+        with self._poll_lock:
+            return self._poll()
+
+    def _poll(self):
+        indices, self.position, lost = self.ring.read_since(self.position)
+        self.lost += lost
+        if len(indices) == 0:
+            return self.latest
+        ids = self.ring.ids[indices]
+        unique_ids, counts = np.unique(ids, return_counts=True)
+        # Index of the last occurrence of each ID in this batch
+        last = len(ids) - 1 - np.unique(ids[::-1], return_index=True)[1]
+        first = np.unique(ids, return_index=True)[1]
+        for arbitration_id, count, first_index, last_index in zip(unique_ids.tolist(), counts.tolist(), first, last):
+            slot = indices[last_index]
+            dlc = int(self.ring.dlcs[slot])
+            payload = self.ring.data[slot, :dlc].tobytes()
+            timestamp = float(self.ring.timestamps[slot])
+            row = self.latest.get(arbitration_id)
+            if row is None:
+                self.latest[arbitration_id] = [count, float(self.ring.timestamps[indices[first_index]]), timestamp, payload]
+            else:
+                row[0] += count
+                row[2] = timestamp
+                row[3] = payload
+        return self.latest
+
+    def decode(self, arbitration_id, payload):
+        message = self.lookup(arbitration_id)
+        if message is None:
+            return None, {}
+        return message.name, message.decode(payload)
@@ -0,0 +1,159 @@
+#Session snapshot/restore: the interface, active messages, signal values and cycle times are kept in a small
+#JSON file (the headless config format, plus each message's encoded frame) that is rewritten whenever they
+#change, and applied at the next launch so a restart after a crash or power cycle resumes where it stopped.
+#Importing python-can alone takes ~100 ms (far longer on a small ARM board), so on SocketCAN a ColdStart
+#thread sends the saved frames from a plain raw socket right after interpreter start, before anything heavy
+#is imported, and the TxScheduler takes each message over at its next deadline. Only the standard library is
+#imported here.
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+DEFAULT_SESSION = os.path.expanduser("~/.tractor_can_session.json")
+
+CAN_EFF_FLAG = 0x80000000
+# struct can_frame: 32 bit ID with flags, 8 bit DLC, 3 pad bytes, 8 data bytes
+CAN_FRAME = struct.Struct("<IB3x8s")
+
+
+def load_session(path):
+    # An empty dict when there is no usable session yet
+    try:
+        with open(path) as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(session, dict) or not isinstance(session.get("messages", {}), dict):
+        return {}
+    session["messages"] = {name: settings for name, settings in session.get("messages", {}).items() if isinstance(settings, dict)}
+    return session
+
+
+def snapshot(controller, config):
+    # The controller state in config form; config supplies the keys the controller does not know (database)
+    session = {key: value for key, value in config.items() if key != "messages"}
+    session.update(interface=controller.channel, bustype=controller.interface, bcm=controller.use_bcm,
+                   bitrate=controller.bitrate, rx_all=not controller.rx_filter,
+                   j1939_responder=controller.responder is not None)
+    messages = session["messages"] = {}
+    for name in controller.messages:
+        message = controller.tx_messages[name]
+        messages[name] = {"active": controller.is_active(name), "cycle_time_ms": controller.cycle_times_ms[name],
+                          "values": dict(controller.values[name])}
+        if len(message.data) <= 8:
+            messages[name]["frame"] = [message.arbitration_id, message.is_extended_id, message.data.hex()]
+    return session
+
+
+class SessionSaver:
+    # update() is called from the GUI stats tick / headless loop and before shutdown; it only writes on change.
+    # keep_active names messages the session had active that could not be started (interface not up yet);
+    # they stay active in the file until they have been started once, so the next launch tries again.
+    # keep_responder does the same for the J1939 responder.
+    def __init__(self, path, controller, config, keep_active=(), keep_responder=False):
+        self.path = path
+        self.controller = controller
+        self.config = config
+        self.keep_active = set(keep_active)
+        self.keep_responder = keep_responder
+        self.saved = None
+
+    def update(self):
+        session = snapshot(self.controller, self.config)
+        for name in list(self.keep_active):
+            if self.controller.is_active(name):
+                self.keep_active.discard(name)
+            elif name in session["messages"]:
+                session["messages"][name]["active"] = True
+        if self.keep_responder:
+            if self.controller.responder is not None:
+                self.keep_responder = False
+            else:
+                session["j1939_responder"] = True
+        if session == self.saved:
+            return
+        # Written next to the target and renamed over it, so a power cut leaves the old or the new file
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(session, f, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not save session to {self.path}: {e}")
+            return
+        self.saved = session
+
+
+class ColdStart:
+    # Cycles the active single-frame messages of a saved session on a raw SocketCAN socket until stop()
+    def __init__(self, session):
+        self.frames = []
+        for name, settings in session.get("messages", {}).items():
+            frame = settings.get("frame")
+            # Cycle times below 1 ms are rejected by the controller too; they would spin this loop
+            if settings.get("active") and frame and settings.get("cycle_time_ms", 0) >= 1:
+                arbitration_id, is_extended_id, data = frame
+                data = bytes.fromhex(data)
+                can_id = arbitration_id | CAN_EFF_FLAG if is_extended_id else arbitration_id
+                self.frames.append((name, CAN_FRAME.pack(can_id, len(data), data), settings["cycle_time_ms"] / 1000))
+        self.sent = 0
+        self.first_sent = None
+        self.deadlines = {}
+        self._stop = threading.Event()
+        self.sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        try:
+            # Send only: an empty filter list keeps received frames from queueing on this socket
+            self.sock.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER, b"")
+            self.sock.bind((session.get("interface", "can0"),))
+        except OSError:
+            self.sock.close()
+            raise
+        self._thread = threading.Thread(target=self._run, name="can-cold-start", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def start(cls, session):
+        # None when there is nothing to send or the session is not on an available SocketCAN channel
+        if session.get("bustype", "socketcan") != "socketcan" or not hasattr(socket, "AF_CAN"):
+            return None
+        if not any(settings.get("active") and settings.get("frame") for settings in session.get("messages", {}).values()):
+            return None
+        try:
+            return cls(session)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Cold start skipped: {e}")
+            return None
+
+    def _run(self):
+        now = time.monotonic()
+        self.deadlines = {name: now for name, frame, period_s in self.frames}
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for name, frame, period_s in self.frames:
+                if self.deadlines[name] > now:
+                    continue
+                try:
+                    self.sock.send(frame)
+                except OSError:
+                    # Queue full or interface down: try again on the next cycle
+                    pass
+                else:
+                    self.sent += 1
+                    if self.first_sent is None:
+                        self.first_sent = time.perf_counter()
+                # A late cycle is skipped rather than sent twice
+                self.deadlines[name] = max(self.deadlines[name] + period_s, now)
+            self._stop.wait(max(0.0, min(self.deadlines.values()) - time.monotonic()))
+
+    def stop(self):
+        # Returns {message name: next monotonic deadline} for TxScheduler.start to continue from
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+        return dict(self.deadlines)
@@ -0,0 +1,354 @@
+#Message/signal definitions for the Tractor CAN messages.
+#Definitions come from a JSON file (tractor_messages.json), a YAML equivalent or a DBC file, and every message
+#is compiled once at load time into a struct.Struct (or bit-mask) packer, so encoding is a single pack_into
+#into a reusable buffer no matter how many messages are defined.
+
+import json
+import math
+import os
+import struct
+
+DEFAULT_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tractor_messages.json")
+
+_STRUCT_CODES = {8: "B", 16: "H", 32: "I", 64: "Q"}
+
+
+class SignalDef:
+    def __init__(self, name, start_bit, length, scale=1.0, offset=0.0, minimum=None, maximum=None,
+                 byte_order="little_endian", is_signed=False, label=None, default="0", integer=False, choices=None):
+        self.name = name
+        self.start_bit = start_bit
+        self.length = length
+        self.scale = scale
+        self.offset = offset
+        self.minimum = minimum
+        self.maximum = maximum
+        self.byte_order = byte_order
+        self.is_signed = is_signed
+        self.label = label
+        self.default = default
+        self.integer = integer
+        self.choices = choices or {}
+        self.mask = (1 << length) - 1
+
+    def parse(self, text):
+        # Turn an entry/config string into a physical value; raises ValueError on bad input
+        if self.choices:
+            if text not in self.choices:
+                raise ValueError(f"{text!r} is not one of {list(self.choices)}")
+            return text
+        if isinstance(text, str):
+            text = text.strip() or str(self.default)
+            value = int(text) if self.integer else float(text)
+        else:
+            value = text
+        # nan and inf (typed, or saved in a session) pass every limit check and cannot be encoded
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not self._is_finite(value):
+            raise ValueError(f"{value!r} is not a finite number")
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"{value} is below {self.minimum}")
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f"{value} is above {self.maximum}")
+        return value
+
+    def _is_finite(self, value):
+        try:
+            return math.isfinite((value - self.offset) / self.scale)
+        except OverflowError:
+            return False
+
+    def to_raw(self, value):
+        if self.choices:
+            return self.choices[value] & self.mask
+        # Truncate and wrap to the field width, the same way the hand-written frame builders did
+        return int((value - self.offset) / self.scale) & self.mask
+
+    def to_raw_array(self, values):
+        # Vectorised to_raw for profile/fuzz buffers (numpy is only imported by callers that need it)
+        import numpy as np
+        if self.choices:
+            raw = np.array([self.choices[value] for value in np.ravel(values)], dtype=np.int64)
+        else:
+            raw = np.trunc((np.asarray(values, dtype=np.float64) - self.offset) / self.scale).astype(np.int64)
+        return (raw & self.mask).astype(np.uint64)
+
+    def from_raw(self, raw):
+        if self.choices:
+            for label, choice in self.choices.items():
+                if choice == raw:
+                    return label
+            return raw
+        if self.is_signed and raw & (1 << (self.length - 1)):
+            raw -= 1 << self.length
+        return raw * self.scale + self.offset
+
+
+class MessageDef:
+    def __init__(self, name, arbitration_id, signals, label=None, is_extended_id=True, dlc=8,
+                 cycle_time_ms=100, data=None):
+        self.name = name
+        self.arbitration_id = arbitration_id
+        self.signals = signals
+        self.label = label or f"{name}:"
+        self.is_extended_id = is_extended_id
+        self.dlc = dlc
+        self.cycle_time_ms = cycle_time_ms
+        self.data = bytes(data or bytes(dlc))
+
+    def compile(self):
+        return CompiledMessage(self)
+
+
+class CompiledMessage:
+    def __init__(self, definition):
+        self.definition = definition
+        self.name = definition.name
+        self.arbitration_id = definition.arbitration_id
+        self.is_extended_id = definition.is_extended_id
+        self.signals = {signal.name: signal for signal in definition.signals}
+        self._buffer = bytearray(definition.data)
+        self._struct, self._fields = _compile_struct(definition)
+        if self._struct is None:
+            self._bit_fields = [_bit_position(signal, definition.dlc) for signal in definition.signals]
+
+    def default_values(self):
+        return {signal.name: signal.parse(signal.default) for signal in self.definition.signals}
+
+    def encode(self, values):
+        if self._struct is not None:
+            args = [const if signal is None else signal.to_raw(values[signal.name]) for signal, const in self._fields]
+            self._struct.pack_into(self._buffer, 0, *args)
+            return bytes(self._buffer)
+        return self._encode_bits(values)
+
+    def encode_array(self, values, count):
+        # Encodes `count` frames at once; values maps signal name -> array of length count (or a scalar).
+        # Returns a (count, dlc) uint8 array.
+        import numpy as np
+        raw_values = {}
+        for signal in self.definition.signals:
+            value = values[signal.name]
+            if np.ndim(value) == 0:
+                value = [value] * count if signal.choices else np.full(count, value, dtype=np.float64)
+            raw_values[signal.name] = signal.to_raw_array(value)
+        return self.encode_raw_array(raw_values, count)
+
+    def encode_raw_array(self, raw_values, count, template=None):
+        # Like encode_array but with raw field values (uint64 arrays) for the listed signals only; the other
+        # bits come from template (default: the message's constant bytes). Used for sweeps over the raw range.
+        import numpy as np
+        dlc = self.definition.dlc
+        if dlc > 8:
+            raise ValueError(f"{self.name} is a multi-packet message; only single-frame messages can be encoded in bulk")
+        template = (self.definition.data if template is None else bytes(template)).ljust(8, b"\x00")
+        little = np.full(count, int.from_bytes(template, "little"), dtype=np.uint64)
+        big_signals = []
+        for signal in self.definition.signals:
+            if signal.name not in raw_values:
+                continue
+            raw = np.asarray(raw_values[signal.name], dtype=np.uint64) & np.uint64(signal.mask)
+            order, shift = _bit_position(signal, dlc)
+            if order == "little":
+                little = (little & ~np.uint64(signal.mask << shift)) | (raw << np.uint64(shift))
+            else:
+                big_signals.append((signal, shift + (8 - dlc) * 8, raw))
+        payload = little.astype("<u8")
+        if big_signals:
+            big = payload.view(">u8").astype(np.uint64)
+            for signal, shift, raw in big_signals:
+                big = (big & ~np.uint64(signal.mask << shift)) | (raw << np.uint64(shift))
+            payload = big.astype(">u8")
+        return payload.view(np.uint8).reshape(count, 8)[:, :dlc]
+
+    def decode_array(self, data):
+        # Inverse of encode_array for an (N, dlc) uint8 array: signal name -> array of physical values
+        # (raw values for enumerated signals)
+        import numpy as np
+        dlc = self.definition.dlc
+        if dlc > 8:
+            raise ValueError(f"{self.name} is a multi-packet message; only single-frame messages can be decoded in bulk")
+        padded = np.zeros((len(data), 8), dtype=np.uint8)
+        padded[:, :dlc] = data[:, :dlc]
+        little = padded.view("<u8")[:, 0].astype(np.uint64)
+        big = None
+        values = {}
+        for signal in self.definition.signals:
+            order, shift = _bit_position(signal, dlc)
+            if order == "little":
+                raw = (little >> np.uint64(shift)) & np.uint64(signal.mask)
+            else:
+                if big is None:
+                    big = padded.view(">u8")[:, 0].astype(np.uint64)
+                raw = (big >> np.uint64(shift + (8 - dlc) * 8)) & np.uint64(signal.mask)
+            raw = raw.astype(np.int64)
+            if signal.choices:
+                values[signal.name] = raw.astype(np.float64)
+                continue
+            if signal.is_signed:
+                raw = np.where(raw & (1 << (signal.length - 1)), raw - (1 << signal.length), raw)
+            values[signal.name] = raw * signal.scale + signal.offset
+        return values
+
+    def decode(self, data):
+        data = bytes(data).ljust(self.definition.dlc, b"\x00")
+        if self._struct is not None:
+            raws = self._struct.unpack_from(data)
+            return {signal.name: signal.from_raw(raw) for (signal, _), raw in zip(self._fields, raws) if signal is not None}
+        values = {}
+        for signal, (byteorder, shift) in zip(self.definition.signals, self._bit_fields):
+            raw = (int.from_bytes(data, byteorder) >> shift) & signal.mask
+            values[signal.name] = signal.from_raw(raw)
+        return values
+
+    def _encode_bits(self, values):
+        # Fallback for signals that are not byte aligned: OR each raw value into the payload integer
+        data = bytes(self._buffer)
+        for byteorder in ("little", "big"):
+            payload = int.from_bytes(data, byteorder)
+            for signal, (order, shift) in zip(self.definition.signals, self._bit_fields):
+                if order != byteorder:
+                    continue
+                payload &= ~(signal.mask << shift)
+                payload |= signal.to_raw(values[signal.name]) << shift
+            data = payload.to_bytes(len(data), byteorder)
+        return data
+
+
+def _bit_position(signal, dlc):
+    # Shift of the signal LSB inside int.from_bytes(payload, byteorder); DBC start bit numbering
+    if signal.byte_order == "little_endian":
+        return "little", signal.start_bit
+    byte, bit = divmod(signal.start_bit, 8)
+    msb = (dlc - 1 - byte) * 8 + bit
+    return "big", msb - signal.length + 1
+
+
+def _compile_struct(definition):
+    # One struct format covering the whole payload: aligned signal fields plus constant template bytes.
+    # Returns (None, None) when a signal is not byte aligned or byte orders are mixed.
+    orders = {signal.byte_order for signal in definition.signals}
+    if len(orders) > 1:
+        return None, None
+    starts = {}
+    for signal in definition.signals:
+        if signal.length not in _STRUCT_CODES:
+            return None, None
+        if signal.byte_order == "little_endian":
+            if signal.start_bit % 8:
+                return None, None
+            first_byte = signal.start_bit // 8
+        else:
+            if signal.start_bit % 8 != 7:
+                return None, None
+            first_byte = signal.start_bit // 8
+        starts[first_byte] = signal
+
+    fmt = ">" if orders == {"big_endian"} else "<"
+    fields = []
+    position = 0
+    while position < definition.dlc:
+        signal = starts.get(position)
+        if signal is None:
+            fmt += "B"
+            fields.append((None, definition.data[position]))
+            position += 1
+            continue
+        fmt += _STRUCT_CODES[signal.length]
+        fields.append((signal, None))
+        position += signal.length // 8
+    if position != definition.dlc or sum(signal is not None for signal, _ in fields) != len(definition.signals):
+        return None, None
+    return struct.Struct(fmt), fields
+
+
+def _parse_id(value):
+    return int(value, 0) if isinstance(value, str) else int(value)
+
+
+def _parse_data(data):
+    # Constant payload template: a list of byte values, or ASCII text for identification strings (VIN, software ID)
+    if isinstance(data, str):
+        return data.encode("ascii")
+    return [_parse_id(byte) for byte in data or []] or None
+
+
+def _message_from_dict(entry):
+    signals = []
+    for signal in entry["signals"]:
+        signals.append(SignalDef(
+            name=signal["name"],
+            start_bit=signal["start_bit"],
+            length=signal["length"],
+            scale=signal.get("scale", 1.0),
+            offset=signal.get("offset", 0.0),
+            minimum=signal.get("min"),
+            maximum=signal.get("max"),
+            byte_order=signal.get("byte_order", "little_endian"),
+            is_signed=signal.get("is_signed", False),
+            label=signal.get("label"),
+            default=signal.get("default", "0"),
+            integer=signal.get("integer", False),
+            choices={label: _parse_id(raw) for label, raw in signal.get("choices", {}).items()},
+        ))
+    return MessageDef(
+        name=entry["name"],
+        arbitration_id=_parse_id(entry["id"]),
+        signals=signals,
+        label=entry.get("label"),
+        is_extended_id=entry.get("extended", True),
+        dlc=entry.get("dlc", 8),
+        cycle_time_ms=entry.get("cycle_time_ms", 100),
+        data=_parse_data(entry.get("data")),
+    )
+
+
+def _load_dbc(path):
+    # cantools is only needed when a DBC file is used
+    try:
+        import cantools
+    except ImportError:
+        raise ImportError("Loading DBC files requires the cantools package (pip install cantools)")
+    messages = []
+    for message in cantools.database.load_file(path).messages:
+        signals = []
+        for signal in message.signals:
+            choices = {str(label): raw for raw, label in (signal.choices or {}).items()}
+            signals.append(SignalDef(
+                name=signal.name,
+                start_bit=signal.start,
+                length=signal.length,
+                scale=signal.scale,
+                offset=signal.offset,
+                minimum=signal.minimum,
+                maximum=signal.maximum,
+                byte_order=signal.byte_order,
+                is_signed=signal.is_signed,
+                label=signal.name if len(message.signals) > 1 else None,
+                default=next(iter(choices)) if choices else str(signal.initial or 0),
+                choices=choices,
+            ))
+        messages.append(MessageDef(
+            name=message.name,
+            arbitration_id=message.frame_id,
+            signals=signals,
+            is_extended_id=message.is_extended_frame,
+            dlc=message.length,
+            cycle_time_ms=message.cycle_time or 100,
+        ))
+    return messages
+
+
+def load_database(path=DEFAULT_DATABASE):
+    # Returns the compiled messages in file order
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".dbc":
+        definitions = _load_dbc(path)
+    else:
+        with open(path) as f:
+            if extension in (".yaml", ".yml"):
+                import yaml
+                content = yaml.safe_load(f)
+            else:
+                content = json.load(f)
+        definitions = [_message_from_dict(entry) for entry in content["messages"]]
+    return [definition.compile() for definition in definitions]
@@ -0,0 +1,57 @@
+#Data side of the GUI strip chart: every plotted signal keeps its samples in a fixed-size NumPy ring, and a
+#redraw reduces the visible window to one min/max pair per pixel column, so the number of canvas points
+#depends on the canvas width and never on how fast samples arrive.
+
+import numpy as np
+
+
+class Trace:
+    def __init__(self, label, capacity=1 << 15):
+        self.label = label
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        # Total samples ever written
+        self.count = 0
+
+    def extend(self, times, values):
+        times = np.asarray(times, dtype=np.float64)[-self.capacity:]
+        values = np.asarray(values, dtype=np.float64)[-self.capacity:]
+        slots = (self.count + np.arange(len(times))) % self.capacity
+        self.times[slots] = times
+        self.values[slots] = values
+        self.count += len(times)
+
+    def window(self, start_time):
+        # Samples at or after start_time, oldest first
+        if self.count <= self.capacity:
+            times, values = self.times[:self.count], self.values[:self.count]
+        else:
+            order = np.roll(np.arange(self.capacity), -(self.count % self.capacity))
+            times, values = self.times[order], self.values[order]
+        first = np.searchsorted(times, start_time)
+        return times[first:], values[first:]
+
+
+def decimate_minmax(times, values, start_time, end_time, width):
+    # Returns (pixel columns, min per column, max per column) for the columns that have samples
+    if len(times) == 0 or width <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    columns = ((times - start_time) * (width / (end_time - start_time))).astype(np.int64).clip(0, width - 1)
+    # times are sorted, so each column is one contiguous run
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    return columns[starts], np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+
+def polyline(columns, minimums, maximums, low, high, height, margin=4):
+    # Flat [x0, y0, x1, y1, ...] list for Canvas.coords: down to the column minimum, up to its maximum
+    span = (high - low) or 1.0
+    scale = (height - 2 * margin) / span
+    y_min = height - margin - (minimums - low) * scale
+    y_max = height - margin - (maximums - low) * scale
+    points = np.empty((len(columns), 4), dtype=np.float64)
+    points[:, 0] = columns
+    points[:, 1] = y_min
+    points[:, 2] = columns
+    points[:, 3] = y_max
+    return points.ravel().tolist()
@@ -0,0 +1,289 @@
+#Holds the current signal values and pre-encoded frames for every defined message and drives the TxScheduler.
+#The GUI (and anything else that changes values) goes through here, so encoding only happens when a value changes.
+
+import can
+
+from bus_load import DEFAULT_BITRATE, LOAD_WARNING, bus_load, format_load
+from signal_db import load_database, DEFAULT_DATABASE
+from tx_scheduler import TxScheduler
+
+MIN_CYCLE_TIME_MS = 1.0
+# Notifier recv timeout; short so stopping the receive thread takes milliseconds
+RX_TIMEOUT_S = 0.05
+
+
+class TractorController:
+    def __init__(self, messages=None, channel="can0", interface="socketcan", use_bcm=False, bitrate=DEFAULT_BITRATE,
+                 rx_filter=True):
+        self.messages = {message.name: message for message in (messages or load_database(DEFAULT_DATABASE))}
+        self.channel = channel
+        self.interface = interface
+        self.use_bcm = use_bcm
+        self.bitrate = bitrate
+        # Only frames of database messages (any source address) and the responder's PGNs reach Python
+        self.rx_filter = rx_filter
+        self.tx_scheduler = None
+        self.notifier = None
+        self.rx_monitor = None
+        self.responder = None
+        self.recorder = None
+        # Frames the scheduler sent, for plotting commanded values at their real rate (see start_tx_capture)
+        self.tx_ring = None
+        self.replay = None
+        self.profile_messages = []
+
+        self.values = {}
+        self.tx_messages = {}
+        self.cycle_times_ms = {}
+        for name, message in self.messages.items():
+            self.values[name] = message.default_values()
+            self.cycle_times_ms[name] = message.definition.cycle_time_ms
+            self._encode(name)
+
+    def get_tx_scheduler(self):
+        # The bus is opened on the first start so the app can come up without the CAN module present
+        if self.tx_scheduler is None:
+            self.tx_scheduler = TxScheduler(self.channel, interface=self.interface, use_bcm=self.use_bcm)
+            self.tx_scheduler.tx_ring = self.tx_ring
+        return self.tx_scheduler
+
+    def set_value(self, message_name, signal_name, value):
+        # Raises ValueError for input the signal definition rejects; the last valid frame stays on the bus
+        self.set_values(message_name, {signal_name: value})
+
+    def set_values(self, message_name, values):
+        message = self.messages[message_name]
+        parsed = {name: message.signals[name].parse(value) for name, value in values.items()}
+        current = self.values[message_name]
+        if all(current[name] == value for name, value in parsed.items()):
+            return
+        # Encoded before the values are stored, so input the encoder rejects leaves values and frame unchanged
+        self._encode(message_name, {**current, **parsed})
+        current.update(parsed)
+        if self.tx_scheduler is not None:
+            self.tx_scheduler.update(message_name, self.tx_messages[message_name])
+
+    def set_cycle_time(self, message_name, cycle_time_ms):
+        # Applied on the next frame of a running message; raises ValueError below MIN_CYCLE_TIME_MS
+        cycle_time_ms = float(cycle_time_ms)
+        if not cycle_time_ms >= MIN_CYCLE_TIME_MS:
+            raise ValueError(f"cycle time must be at least {MIN_CYCLE_TIME_MS:g} ms")
+        if self.is_active(message_name):
+            self._warn_bus_load({message_name: cycle_time_ms})
+        self.cycle_times_ms[message_name] = cycle_time_ms
+        if self.tx_scheduler is not None:
+            self.tx_scheduler.set_period(message_name, cycle_time_ms / 1000)
+
+    def _encode(self, message_name, values=None):
+        message = self.messages[message_name]
+        self.tx_messages[message_name] = can.Message(
+            arbitration_id=message.arbitration_id,
+            data=message.encode(self.values[message_name] if values is None else values),
+            is_extended_id=message.is_extended_id
+        )
+
+    def bus_load(self, overrides=None):
+        # Worst-case utilisation of the active messages; overrides ({name: cycle time ms}) are counted as
+        # active with that cycle time, to check a start or cycle-time change before making it
+        cycle_times_ms = {name: cycle for name, cycle in self.cycle_times_ms.items() if self.is_active(name)}
+        cycle_times_ms.update(overrides or {})
+        return bus_load(((len(self.tx_messages[name].data), self.tx_messages[name].is_extended_id, cycle / 1000)
+                         for name, cycle in cycle_times_ms.items()), self.bitrate)
+
+    def _warn_bus_load(self, overrides):
+        load = self.bus_load(overrides)
+        if load >= LOAD_WARNING:
+            print(f"Warning: expected bus load {format_load(load, self.bitrate)}")
+        return load
+
+    def is_active(self, message_name):
+        return self.tx_scheduler is not None and self.tx_scheduler.is_active(message_name)
+
+    def start(self, message_name, first_deadline=None):
+        if self.is_active(message_name):
+            return
+        self._warn_bus_load({message_name: self.cycle_times_ms[message_name]})
+        period_s = self.cycle_times_ms[message_name] / 1000
+        self.get_tx_scheduler().start(message_name, self.tx_messages[message_name], period_s, first_deadline)
+        self._update_replay_overrides()
+        print(f"{message_name} CAN message started.")
+
+    def stop(self, message_name):
+        if not self.is_active(message_name):
+            return
+        self.tx_scheduler.stop(message_name)
+        self._update_replay_overrides()
+        print(f"{message_name} CAN message stopped.")
+
+    def stats_snapshot(self):
+        if self.tx_scheduler is None:
+            return {}
+        return self.tx_scheduler.stats_snapshot()
+
+    def get_notifier(self):
+        # One Notifier on the scheduler's socket feeds the receive monitor and the J1939 responder
+        if self.notifier is None:
+            self.notifier = can.Notifier(self.get_tx_scheduler().bus, [], timeout=RX_TIMEOUT_S)
+            self._update_rx_filters()
+        return self.notifier
+
+    def _update_rx_filters(self):
+        # SocketCAN applies these in the kernel, so unrelated traffic never wakes the receive thread
+        if self.tx_scheduler is None or not self.rx_filter:
+            return
+        filters = [{"can_id": message.arbitration_id & 0x03FFFF00, "can_mask": 0x03FFFF00, "extended": True}
+                   if message.is_extended_id else {"can_id": message.arbitration_id, "can_mask": 0x7FF, "extended": False}
+                   for message in self.messages.values()]
+        if self.responder is not None:
+            filters += self.responder.rx_filters()
+        self.tx_scheduler.bus.set_filters(filters)
+
+    def _release_notifier(self):
+        if self.notifier is not None and self.rx_monitor is None and self.responder is None:
+            notifier, self.notifier = self.notifier, None
+            notifier.stop()
+
+    def current_message(self, message_name):
+        # What is on the bus for this message right now (a running profile's sample, otherwise the entry values)
+        message = self.tx_scheduler.current_message(message_name) if self.tx_scheduler is not None else None
+        return message if message is not None else self.tx_messages[message_name]
+
+    def start_receive(self):
+        # Listens on the same socket the scheduler sends on; numpy is only loaded once the monitor is used
+        if self.rx_monitor is None:
+            from rx_monitor import RxMonitor
+            self.rx_monitor = RxMonitor(self.get_notifier(), self.messages.values())
+            print("Receive monitor started.")
+        return self.rx_monitor
+
+    def stop_receive(self):
+        if self.rx_monitor is not None:
+            self.rx_monitor.recorder = None
+            self.rx_monitor.close()
+            self.rx_monitor = None
+            self._release_notifier()
+            print("Receive monitor stopped.")
+
+    def start_tx_capture(self):
+        # Copies every cyclic frame the userspace scheduler sends into a ring buffer (frames timed by kernel BCM
+        # tasks are not seen); numpy is only loaded once something captures
+        if self.tx_ring is None:
+            from rx_monitor import RxRingBuffer
+            self.tx_ring = RxRingBuffer()
+            if self.tx_scheduler is not None:
+                self.tx_scheduler.tx_ring = self.tx_ring
+        return self.tx_ring
+
+    def stop_tx_capture(self):
+        self.tx_ring = None
+        if self.tx_scheduler is not None:
+            self.tx_scheduler.tx_ring = None
+
+    def start_responder(self):
+        # Answers J1939 requests and address claims for the source addresses in the database
+        if self.responder is None:
+            from j1939 import J1939Responder
+            notifier = self.get_notifier()
+            self.responder = J1939Responder(self)
+            self._update_rx_filters()
+            notifier.add_listener(self.responder)
+            print("J1939 responder started.")
+        return self.responder
+
+    def stop_responder(self):
+        if self.responder is not None:
+            self.notifier.remove_listener(self.responder)
+            self.responder = None
+            self._update_rx_filters()
+            self._release_notifier()
+            print("J1939 responder stopped.")
+
+    def start_recording(self, path, include_rx=True, max_bytes=None, max_seconds=None):
+        if self.recorder is not None:
+            return self.recorder
+        from recorder import Recorder
+        self.recorder = Recorder(path, max_bytes=max_bytes, max_seconds=max_seconds)
+        self.get_tx_scheduler().recorder = self.recorder
+        if self.replay is not None:
+            self.replay.recorder = self.recorder
+        if include_rx:
+            self.start_receive().recorder = self.recorder
+        print(f"Recording CAN traffic to {path}")
+        return self.recorder
+
+    def stop_recording(self):
+        if self.recorder is None:
+            return
+        if self.tx_scheduler is not None:
+            self.tx_scheduler.recorder = None
+        if self.rx_monitor is not None:
+            self.rx_monitor.recorder = None
+        if self.replay is not None:
+            self.replay.recorder = None
+        recorder, self.recorder = self.recorder, None
+        recorder.close()
+        print(f"Recording stopped: {recorder.recorded} frames, {recorder.dropped} dropped, files {recorder.files}")
+
+    def start_replay(self, path, speed=1.0, include_ids=None, exclude_ids=None):
+        # Replays a trace on the scheduler's bus; messages started here override their IDs in the log.
+        # Raises ValueError unless speed is a positive finite factor (a running replay is kept then)
+        speed = float(speed)
+        if not 0 < speed < float("inf"):
+            raise ValueError(f"replay speed must be a positive number, not {speed:g}")
+        from replay import LogReplay
+        self.stop_replay()
+        self.replay = LogReplay(self.get_tx_scheduler().bus, path, speed, include_ids, exclude_ids)
+        self.replay.recorder = self.recorder
+        self._update_replay_overrides()
+        print(f"Replaying {path} at {speed:g}x")
+        return self.replay
+
+    def stop_replay(self):
+        if self.replay is not None:
+            replay, self.replay = self.replay, None
+            replay.stop()
+
+    def _update_replay_overrides(self):
+        if self.replay is None:
+            return
+        from replay import j1939_key
+        self.replay.override_ids = frozenset(j1939_key(message.arbitration_id, message.is_extended_id)
+                                             for name, message in self.messages.items() if self.is_active(name))
+
+    def start_profile(self, path):
+        # Profiles are sampled at the current cycle times; restart the profile after changing a cycle time
+        from profiles import load_profile
+        frames, loop = load_profile(path, self)
+        self.stop_profile()
+        for message_name, payloads in frames.items():
+            self.start(message_name)
+            self.tx_scheduler.set_profile(message_name, payloads, loop)
+        self.profile_messages = list(frames)
+        print(f"Profile {path} running on {', '.join(self.profile_messages)}")
+
+    def stop_profile(self):
+        # Messages keep transmitting with their current (entry) values
+        if self.tx_scheduler is not None:
+            for message_name in self.profile_messages:
+                self.tx_scheduler.clear_profile(message_name, self.tx_messages[message_name])
+        self.profile_messages = []
+
+    def profile_progress(self):
+        # Fraction of the longest running profile that has been sent, or None when no profile runs
+        if self.tx_scheduler is None:
+            return None
+        progress = [self.tx_scheduler.profile_progress(name) for name in self.profile_messages]
+        progress = [index / max(1, count - 1) for index, count in filter(None, progress)]
+        return min(progress) if progress else None
+
+    def shutdown(self):
+        self.stop_profile()
+        self.stop_replay()
+        self.stop_recording()
+        self.stop_receive()
+        self.stop_responder()
+        for message_name in self.messages:
+            self.stop(message_name)
+        if self.tx_scheduler is not None:
+            self.tx_scheduler.shutdown()
+            self.tx_scheduler = None
@@ -0,0 +1,346 @@
+#Single transmit engine for the cyclic Tractor CAN messages.
+#One thread owns one bus socket and keeps a heap of absolute monotonic deadlines (one per active message),
+#so every frame that is due goes out in a single wakeup and the period never drifts by encode/send time.
+#With use_bcm the messages are instead handed to the SocketCAN broadcast manager (send_periodic) and the kernel
+#does the timing; interfaces without BCM support (e.g. virtual) fall back to the userspace scheduler.
+#Start, stop and period changes only touch the heap under the lock and notify the thread, so they never wait
+#on a send or a sleep, and shutdown wakes the thread immediately.
+#Frames that are due go out in CAN arbitration order (lowest ID first), and a send that fails (ENOBUFS when
+#the socket queue is full) is retried with exponential backoff instead of dropped. At most one frame per
+#message waits for a retry; when the next cycle comes due first the newer payload replaces it, so the queue
+#stays bounded by the number of active messages and a backed-up bus sheds low-priority frames first.
+#Payloads longer than 8 bytes go out as J1939 BAM transfers (see j1939.py): each cycle pushes a Transfer onto
+#the same heap, so its TP.DT packets are paced between the cyclic frames instead of blocking them. Receivers
+#track one BAM per source address, so BAMs from the same address (DM1 and VIN from one ECU, a responder
+#answer) wait in a FIFO and each TP.CM only goes out once the previous transfer has finished.
+
+import heapq
+import threading
+import time
+from collections import deque
+
+import can
+
+from j1939 import Transfer
+from tx_stats import MessageStats
+
+RETRY_MIN_S = 0.0005
+RETRY_MAX_S = 0.01
+
+
+def arbitration_priority(message):
+    # Lower wins, like on the wire: 11 bit IDs compare against the top 11 bits of 29 bit IDs
+    return message.arbitration_id if message.is_extended_id else message.arbitration_id << 18
+
+
+class TxEntry:
+    def __init__(self, key, message, period_s):
+        self.key = key
+        self.message = message
+        self.period_s = period_s
+        self.bcm_task = None
+        self.last_deadline = None
+        self.stats = MessageStats(period_s)
+        # Drive-cycle profile: precomputed payload per cycle, picked by index on each tick
+        self.frames = None
+        self.frames_start = None
+        self.frames_loop = False
+        self.frame_index = 0
+        # Transport protocol transfer carrying the current cycle of a payload longer than 8 bytes
+        self.transfer = None
+        # Bumped when the period changes so heap items queued with the old period are skipped
+        self.generation = 0
+
+
+class TxScheduler:
+    def __init__(self, channel, interface="socketcan", use_bcm=False):
+        self.channel = channel
+        self.interface = interface
+        self.use_bcm = use_bcm and interface == "socketcan"
+        self.bus = can.interface.Bus(channel=channel, interface=interface)
+
+        self._entries = {}
+        self._heap = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._running = True
+        # Optional recorder.Recorder; frames sent by kernel BCM tasks never pass through here
+        self.recorder = None
+        # Optional rx_monitor.RxRingBuffer that gets every cyclic frame sent here (the GUI strip chart reads it)
+        self.tx_ring = None
+        # {source address: deque of BAM transfers}; the first one is on the heap, the rest wait for it
+        self._bam_queues = {}
+        # Send-thread only: {key: (priority, entry, deadline)} waiting for the bus, and when to retry them
+        self._pending = {}
+        self._retry_at = None
+        self._backoff = RETRY_MIN_S
+
+        self._thread = threading.Thread(target=self._run, name="can-tx", daemon=True)
+        self._thread.start()
+
+    def start(self, key, message, period_s, first_deadline=None):
+        # Starting a message only adds a heap entry, no new thread or socket; the first frame goes out at
+        # first_deadline (monotonic, default now), so a message another sender was cycling keeps its period
+        with self._cond:
+            if key in self._entries:
+                return
+            entry = TxEntry(key, message, period_s)
+            self._entries[key] = entry
+            if self.use_bcm and len(message.data) <= 8 and self._start_bcm(entry):
+                return
+            self._push(entry, time.monotonic() if first_deadline is None else first_deadline)
+            self._cond.notify()
+
+    def stop(self, key):
+        # Stale heap entries are skipped when they come due
+        with self._cond:
+            entry = self._entries.pop(key, None)
+        if entry is not None and entry.bcm_task is not None:
+            entry.bcm_task.stop()
+
+    def set_period(self, key, period_s):
+        # Takes effect on the next frame: the entry is rescheduled one new period after its last deadline
+        # (or now, if that has already passed); kernel tasks are re-registered with the new interval
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is None or entry.period_s == period_s:
+                return
+            entry.period_s = period_s
+            entry.stats = MessageStats(period_s)
+            entry.generation += 1
+            if entry.bcm_task is None:
+                last_deadline = entry.last_deadline if entry.last_deadline is not None else time.monotonic()
+                deadline = max(last_deadline + period_s, time.monotonic())
+                if entry.frames_start is not None:
+                    # A running profile continues from its current sample, one sample per new period
+                    entry.frames_start = deadline - (entry.frame_index + 1) * period_s
+                self._push(entry, deadline)
+                self._cond.notify()
+                return
+            task = entry.bcm_task
+        task.stop()
+        with self._cond:
+            if self._entries.get(key) is entry and not self._start_bcm(entry):
+                entry.bcm_task = None
+                self._push(entry, time.monotonic())
+                self._cond.notify()
+
+    def update(self, key, message):
+        # Swap in a pre-encoded frame after a value changed; the send loop only ever reads entry.message.
+        # Kernel tasks get the new payload in place without a restart.
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is None or entry.frames is not None:
+                return
+            entry.message = message
+        if entry.bcm_task is not None:
+            entry.bcm_task.modify_data(message)
+
+    def set_profile(self, key, frames, loop=False):
+        # The profile owns its own Message so the data swap on each tick never touches the caller's frame.
+        # Profiles always run in userspace; a kernel BCM task for the message is replaced.
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.message = can.Message(arbitration_id=entry.message.arbitration_id, data=frames[0],
+                                        is_extended_id=entry.message.is_extended_id)
+            entry.frames_start = None
+            entry.frame_index = 0
+            entry.frames_loop = loop
+            entry.frames = frames
+            if entry.bcm_task is not None:
+                entry.bcm_task.stop()
+                entry.bcm_task = None
+                self._push(entry, time.monotonic())
+                self._cond.notify()
+
+    def clear_profile(self, key, message):
+        # Under the lock, so the send thread never sees the profile half removed or writes a profile sample
+        # into the caller's message
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.frames = None
+            entry.message = message
+
+    def current_message(self, key):
+        # The frame going out on the next tick (a profile's current sample), or None when not scheduled here
+        entry = self._entries.get(key)
+        return None if entry is None else entry.message
+
+    def profile_progress(self, key):
+        # (current index, number of frames) or None when the message has no profile
+        entry = self._entries.get(key)
+        if entry is None or entry.frames is None:
+            return None
+        return entry.frame_index, len(entry.frames)
+
+    def _start_bcm(self, entry):
+        try:
+            entry.bcm_task = self.bus.send_periodic(entry.message, entry.period_s, store_task=False)
+        except (can.CanError, OSError, NotImplementedError):
+            print(f"Kernel BCM not available on {self.channel}, using userspace scheduler")
+            self.use_bcm = False
+            return False
+        return True
+
+    def is_active(self, key):
+        return key in self._entries
+
+    def is_alive(self):
+        # False once the send thread has exited (shutdown, or an unexpected error in it)
+        return self._thread.is_alive()
+
+    def stats_snapshot(self):
+        # {key: stats dict} for active messages; kernel BCM tasks are timed by the kernel and report None
+        return {key: None if entry.bcm_task is not None else entry.stats.snapshot()
+                for key, entry in list(self._entries.items())}
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._cond.notify()
+        for entry in entries:
+            if entry.bcm_task is not None:
+                entry.bcm_task.stop()
+        self._thread.join()
+        self.bus.shutdown()
+
+    def _push(self, entry, deadline):
+        # entry is a TxEntry or a j1939.Transfer whose next packet is due at deadline
+        self._seq += 1
+        generation = entry.generation if isinstance(entry, TxEntry) else 0
+        heapq.heappush(self._heap, (deadline, self._seq, entry, generation))
+
+    def _collect_due(self):
+        # Called with the lock held; pops every entry whose deadline has passed and reschedules it.
+        # Returns (entry, deadline, key, message) items; the message of a cyclic entry is taken here, with its
+        # profile sample applied, so the sends outside the lock never read entry state that may change
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, entry, generation = heapq.heappop(self._heap)
+            if isinstance(entry, Transfer):
+                self._collect_transfer(entry, deadline, due)
+                continue
+            if self._entries.get(entry.key) is not entry or generation != entry.generation:
+                continue
+            entry.last_deadline = deadline
+            next_deadline = deadline + entry.period_s
+            if next_deadline <= now:
+                # Skip cycles we already missed instead of bursting to catch up
+                missed = int((now - next_deadline) / entry.period_s) + 1
+                next_deadline += missed * entry.period_s
+            self._push(entry, next_deadline)
+            if len(entry.message.data) <= 8:
+                if entry.frames is not None:
+                    self._next_profile_frame(entry, deadline)
+                due.append((entry, deadline, entry.key, entry.message))
+            elif entry.transfer is not None and not entry.transfer.finished:
+                # The previous BAM is still being paced out; this cycle is skipped
+                entry.stats.record_dropped()
+            else:
+                # Multi-packet payload: its TP.CM is due now, the TP.DT packets follow on the heap
+                entry.transfer = Transfer(entry.message, entry=entry)
+                self._queue_transfer(entry.transfer, deadline)
+        return due
+
+    def _queue_transfer(self, transfer, deadline):
+        # Called with the lock held
+        queue = self._bam_queues.setdefault(transfer.source_address, deque())
+        queue.append(transfer)
+        if len(queue) == 1:
+            self._push(transfer, deadline)
+
+    def _collect_transfer(self, transfer, deadline, due):
+        index = transfer.next_index
+        transfer.next_index += 1
+        if transfer.next_index < transfer.count:
+            self._push(transfer, deadline + transfer.gap_s)
+        else:
+            # Last packet: the next BAM from this source address may start one packet gap later
+            queue = self._bam_queues[transfer.source_address]
+            queue.popleft()
+            if queue:
+                self._push(queue[0], deadline + transfer.gap_s)
+            else:
+                del self._bam_queues[transfer.source_address]
+        # Only the TP.CM of a cyclic transfer counts towards the message's timing stats
+        entry = transfer.entry if index == 0 else None
+        due.append((entry, deadline, (transfer, index), transfer.frame(index)))
+
+    def send_transfer(self, transfer):
+        # Paces a one-off broadcast (BAM) transfer, e.g. a response to a J1939 request, between the cyclic frames
+        with self._cond:
+            self._queue_transfer(transfer, time.monotonic())
+            self._cond.notify()
+
+    def _next_profile_frame(self, entry, deadline):
+        # Called with the lock held. Index follows the deadline, so skipped cycles skip profile samples instead
+        # of stretching the profile
+        frames = entry.frames
+        if entry.frames_start is None:
+            entry.frames_start = deadline
+        index = int((deadline - entry.frames_start) / entry.period_s + 0.5)
+        if index >= len(frames):
+            index = index % len(frames) if entry.frames_loop else len(frames) - 1
+        entry.frame_index = index
+        entry.message.data = frames[index]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    wake_at = self._heap[0][0] if self._heap else None
+                    if self._retry_at is not None and (wake_at is None or self._retry_at < wake_at):
+                        wake_at = self._retry_at
+                    if wake_at is None:
+                        self._cond.wait()
+                        continue
+                    timeout = wake_at - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                due = self._collect_due()
+
+            # Send outside the lock so start/stop never wait on the bus
+            for entry, deadline, key, message in due:
+                if key in self._pending:
+                    # The previous cycle never made it onto the bus; the fresh payload replaces it
+                    entry.stats.record_dropped()
+                self._pending[key] = (arbitration_priority(message), entry, deadline, message)
+            # Newly due frames are tried right away; otherwise only once the backoff has passed
+            if self._pending and (due or self._retry_at is None or time.monotonic() >= self._retry_at):
+                self._send_pending()
+
+    def _send_pending(self):
+        # Transport packets (keyed by (transfer, index)) are never replaced, so a BAM is not cut short
+        self._retry_at = None
+        for key, (_, entry, deadline, message) in sorted(self._pending.items(), key=lambda item: item[1][0]):
+            if not isinstance(key, tuple) and self._entries.get(key) is not entry:
+                del self._pending[key]
+                continue
+            try:
+                self.bus.send(message)
+            except can.CanError:
+                # Usually ENOBUFS: the socket queue is full, so lower-priority frames would fail as well
+                if entry is not None:
+                    entry.stats.record_error()
+                self._retry_at = time.monotonic() + self._backoff
+                self._backoff = min(self._backoff * 2, RETRY_MAX_S)
+                return
+            del self._pending[key]
+            self._backoff = RETRY_MIN_S
+            if entry is not None:
+                entry.stats.record_sent(deadline, time.monotonic())
+            if self.recorder is not None:
+                self.recorder.record_message(message, is_rx=False)
+            tx_ring = self.tx_ring
+            if tx_ring is not None and not isinstance(key, tuple):
+                tx_ring.append(time.time(), message.arbitration_id, message.data)
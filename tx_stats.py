@@ -0,0 +1,107 @@
+#Per-message timing counters for the transmit engine.
+#The TxScheduler records every send; the GUI status labels and the CSV/JSON-lines logger read snapshots
+#with frames sent, CanError count and p50/p99/max of the period jitter and send latency over a rolling window.
+
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class MessageStats:
+    def __init__(self, period_s, window=1000):
+        self.period_s = period_s
+        self.sent = 0
+        self.errors = 0
+        # Frames replaced by the next cycle's payload before the bus accepted them
+        self.dropped = 0
+        self.last_sent_at = None
+        # Rolling windows of achieved period error and send latency, in seconds
+        self.jitter = deque(maxlen=window)
+        self.latency = deque(maxlen=window)
+        self.periods = deque(maxlen=window)
+
+    def record_sent(self, deadline, sent_at):
+        # deadline is when the frame was due, sent_at is when bus.send returned (both monotonic)
+        self.sent += 1
+        self.latency.append(sent_at - deadline)
+        if self.last_sent_at is not None:
+            period = sent_at - self.last_sent_at
+            self.periods.append(period)
+            self.jitter.append(abs(period - self.period_s))
+        self.last_sent_at = sent_at
+
+    def record_error(self):
+        self.errors += 1
+
+    def record_dropped(self):
+        self.dropped += 1
+
+    def snapshot(self):
+        # list() copies a deque atomically under the GIL, so this is safe to call from another thread
+        jitter = sorted(self.jitter)
+        latency = sorted(self.latency)
+        periods = sorted(self.periods)
+        return {
+            "sent": self.sent,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "period_ms": self.period_s * 1000,
+            "period_p50_ms": _percentile(periods, 0.5) * 1000,
+            "jitter_p50_ms": _percentile(jitter, 0.5) * 1000,
+            "jitter_p99_ms": _percentile(jitter, 0.99) * 1000,
+            "jitter_max_ms": (jitter[-1] if jitter else 0.0) * 1000,
+            "latency_p50_ms": _percentile(latency, 0.5) * 1000,
+            "latency_p99_ms": _percentile(latency, 0.99) * 1000,
+            "latency_max_ms": (latency[-1] if latency else 0.0) * 1000,
+        }
+
+
+def format_stats(stats):
+    return (f"sent {stats['sent']}  err {stats['errors']}  dropped {stats['dropped']}\n"
+            f"period {stats['period_p50_ms']:.1f} ms  jitter p50/p99/max "
+            f"{stats['jitter_p50_ms']:.2f}/{stats['jitter_p99_ms']:.2f}/{stats['jitter_max_ms']:.2f} ms")
+
+
+class StatsLogger:
+    # Periodically dumps snapshot_fn() ({message name: stats}) to a .csv file or JSON lines (any other extension)
+    FIELDS = ["time", "message", "sent", "errors", "dropped", "period_ms", "period_p50_ms", "jitter_p50_ms", "jitter_p99_ms",
+              "jitter_max_ms", "latency_p50_ms", "latency_p99_ms", "latency_max_ms"]
+
+    def __init__(self, path, snapshot_fn, interval_s=1.0):
+        self.path = path
+        self.snapshot_fn = snapshot_fn
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="can-stats", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        is_csv = self.path.endswith(".csv")
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS) if is_csv else None
+            if writer is not None and f.tell() == 0:
+                writer.writeheader()
+            while not self._stop.wait(self.interval_s):
+                now = time.time()
+                for name, stats in self.snapshot_fn().items():
+                    # None for messages timed by the kernel (BCM); there are no counters to log
+                    if stats is None:
+                        continue
+                    row = dict(stats, time=now, message=name)
+                    if writer is not None:
+                        writer.writerow(row)
+                    else:
+                        f.write(json.dumps(row) + "\n")
+                f.flush()